@@ -0,0 +1,86 @@
+"""تحليلات على مستوى المجتمع تُحسب مرة واحدة عند تحميل النموذج
+
+كل الحسابات تتم بتمريرات مجمعة على النموذج (مصفوفة واحدة لكل نوع تحليل)
+بدلاً من طلب تنبؤ لكل نقطة.
+"""
+import numpy as np
+
+RISK_LEVELS = ["منخفض", "متوسط", "مرتفع"]
+RISK_BOUNDARIES = [0.3, 0.7]
+
+def feature_grid(values, integer, grid_size):
+    """قيم الشبكة لميزة واحدة بين المئين 1 و 99 في العينة المرجعية"""
+    low, high = np.quantile(values, [0.01, 0.99])
+    grid = np.linspace(low, high, grid_size)
+    if integer:
+        grid = np.unique(np.round(grid))
+    return grid
+
+def compute_population_analytics(score, X, feature_names, integer_features,
+                                 grid_size=20, pd_rows=200, histogram_bins=20):
+    """منحنيات الاعتماد الجزئي وتوزيع الخطر ومتوسط التأثيرات على عينة مرجعية
+
+    score: دالة تستقبل مصفوفة القيم الخام وتعيد احتمالية المرض لكل صف
+    X: العينة المرجعية بالقيم الخام (n_samples, n_features)
+    """
+    X = np.asarray(X, dtype=float)
+    n_samples, n_features = X.shape
+
+    # توزيع الخطر العام
+    probabilities = score(X)
+    counts, edges = np.histogram(probabilities, bins=histogram_bins, range=(0, 1))
+    levels = np.digitize(probabilities, RISK_BOUNDARIES)
+    risk_distribution = {
+        'n_samples': int(n_samples),
+        'mean_probability': float(probabilities.mean()),
+        'bin_edges': np.round(edges, 6).tolist(),
+        'counts': counts.tolist(),
+        'risk_levels': {
+            level: int((levels == i).sum()) for i, level in enumerate(RISK_LEVELS)
+        }
+    }
+
+    # الاعتماد الجزئي: كل الميزات وكل نقاط الشبكة في مصفوفة واحدة
+    sample = X[:pd_rows]
+    grids = [
+        feature_grid(X[:, j], feature in integer_features, grid_size)
+        for j, feature in enumerate(feature_names)
+    ]
+    blocks = []
+    for j, grid in enumerate(grids):
+        block = np.repeat(sample[np.newaxis], len(grid), axis=0)
+        block[:, :, j] = grid[:, np.newaxis]
+        blocks.append(block.reshape(-1, n_features))
+    pd_probabilities = score(np.vstack(blocks))
+
+    partial_dependence = {}
+    offset = 0
+    for feature, grid in zip(feature_names, grids):
+        size = len(grid) * len(sample)
+        curve = pd_probabilities[offset:offset + size].reshape(len(grid), len(sample)).mean(axis=1)
+        partial_dependence[feature] = {'values': grid.tolist(), 'probability': curve.tolist()}
+        offset += size
+
+    # متوسط التأثيرات (occlusion): الفرق عند استبدال الميزة بمتوسطها في العينة
+    means = X.mean(axis=0)
+    occluded = np.repeat(X[np.newaxis], n_features, axis=0)
+    for j in range(n_features):
+        occluded[j, :, j] = means[j]
+    contributions = probabilities[np.newaxis] - score(occluded.reshape(-1, n_features)).reshape(n_features, n_samples)
+
+    attributions = {
+        'method': 'occlusion',
+        'features': {
+            feature: {
+                'mean': float(contributions[j].mean()),
+                'mean_abs': float(np.abs(contributions[j]).mean())
+            }
+            for j, feature in enumerate(feature_names)
+        }
+    }
+
+    return {
+        'partial_dependence': partial_dependence,
+        'risk_distribution': risk_distribution,
+        'attributions': attributions
+    }
@@ -1,17 +1,47 @@
-from flask import Flask, request, jsonify
+import time
+
+# بداية الاستيراد لقياس زمن تشغيل كل عامل
+IMPORT_STARTED = time.perf_counter()
+
+import os
+
+# ميزانية خيوط المعالج لهذا العامل: BLAS و OpenMP بخيط واحد (قبل استيراد numpy)
+# وحصة العامل لتقسيم الدفعات الكبيرة
+from thread_budget import ChunkedExecutor, compute_budget, limit_loaded_pools, pin_model_threads, pin_native_threads
+
+THREAD_BUDGET = compute_budget(
+    threads=int(os.environ['WORKER_THREADS']) if os.environ.get('WORKER_THREADS') else None,
+    parallel_min_rows=int(os.environ.get('PARALLEL_MIN_ROWS', 1000))
+)
+THREAD_BUDGET['env'] = pin_native_threads(1)
+
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import joblib
 import numpy as np
-import pandas as pd
 import logging
-import os
+import json
+import math
+import re
+import threading
+import resource
+import hashlib
+import hmac
 from datetime import datetime
-import shap
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 import warnings
 
+from audit import AuditLog, sqlite_path
+from analytics import RISK_LEVELS, RISK_BOUNDARIES, compute_population_analytics
+from compact_trees import CompactTrees, domain_sample
+from explainers import model_family, select_explainer
+from profiler import SamplingProfiler, to_collapsed, to_speedscope
+from rescoring import Rescorer, shared_secret
+
+try:
+    import orjson  # ترميز JSON أسرع (اختياري)
+except ImportError:
+    orjson = None
+
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
@@ -28,6 +58,12 @@ logger = logging.getLogger(__name__)
 model = None
 scaler = None
 explainer = None
+model_importances = None
+model_version = None
+surrogate = None
+compact_model = None
+rescoring = None
+population_analytics = {}
 feature_names_ar = {
     'age': 'العمر',
     'sex': 'الجنس',
@@ -46,92 +82,364 @@ feature_names_ar = {
 
 feature_names = list(feature_names_ar.keys())
 
-def create_synthetic_data():
-    """إنشاء بيانات تصنيعية للتدريب إذا لم تكن متوفرة"""
-    np.random.seed(42)
-    n_samples = 1000
-    
-    # إنشاء البيانات
-    data = {
-        'age': np.random.randint(29, 80, n_samples),
-        'sex': np.random.randint(0, 2, n_samples),
-        'cp': np.random.randint(0, 4, n_samples),
-        'trestbps': np.random.normal(130, 15, n_samples).clip(90, 200).astype(int),
-        'chol': np.random.normal(240, 50, n_samples).clip(150, 400).astype(int),
-        'fbs': np.random.randint(0, 2, n_samples),
-        'restecg': np.random.randint(0, 3, n_samples),
-        'thalach': np.random.normal(150, 20, n_samples).clip(100, 200).astype(int),
-        'exang': np.random.randint(0, 2, n_samples),
-        'oldpeak': np.random.exponential(1, n_samples).clip(0, 6),
-        'slope': np.random.randint(0, 3, n_samples),
-        'ca': np.random.randint(0, 5, n_samples),
-        'thal': np.random.randint(1, 4, n_samples)
+# ===== جداول مسار الطلب، تُبنى مرة واحدة عند بدء التشغيل =====
+
+# النطاقات المسموحة لكل ميزة
+FEATURE_RANGES = {
+    'age': (1, 120),
+    'sex': (0, 1),
+    'cp': (0, 3),
+    'trestbps': (80, 250),
+    'chol': (100, 600),
+    'fbs': (0, 1),
+    'restecg': (0, 2),
+    'thalach': (60, 220),
+    'exang': (0, 1),
+    'oldpeak': (0, 10),
+    'slope': (0, 2),
+    'ca': (0, 4),
+    'thal': (1, 3)
+}
+
+FEATURE_INDEX = {feature: i for i, feature in enumerate(feature_names)}
+
+FEATURE_BOUNDS = [
+    (feature, FEATURE_INDEX[feature], min_val, max_val)
+    for feature, (min_val, max_val) in FEATURE_RANGES.items()
+]
+
+MISSING_FIELD_ERRORS = {feature: f"الحقل المطلوب '{feature}' مفقود" for feature in feature_names}
+
+RANGE_ERRORS = {
+    feature: f"قيمة {feature_names_ar.get(feature, feature)} يجب أن تكون بين {min_val} و {max_val}"
+    for feature, (min_val, max_val) in FEATURE_RANGES.items()
+}
+
+# قوالب وصف تأثير كل ميزة ({value} تُملأ فقط للعوامل المعروضة)
+DESCRIPTION_TEMPLATES = {
+    'age': {
+        True: "العمر {value} سنة يزيد من مخاطر أمراض القلب مع التقدم في السن",
+        False: "العمر {value} سنة ضمن النطاق الآمن نسبياً"
+    },
+    'sex': {
+        True: "الجنس الذكري يرتبط بمخاطر أعلى لأمراض القلب",
+        False: "الجنس الأنثوي يرتبط بمخاطر أقل نسبياً"
+    },
+    'cp': {
+        True: "نوع ألم الصدر ({value}) يشير لمخاطر قلبية",
+        False: "نوع ألم الصدر ({value}) أقل ارتباطاً بمشاكل القلب"
+    },
+    'trestbps': {
+        True: "ضغط الدم {value} مرتفع ويزيد المخاطر القلبية",
+        False: "ضغط الدم {value} ضمن المعدل الطبيعي"
+    },
+    'chol': {
+        True: "مستوى الكولسترول {value} مرتفع ويؤثر على صحة القلب",
+        False: "مستوى الكولسترول {value} ضمن المعدل المقبول"
+    },
+    'thalach': {
+        True: "معدل ضربات القلب القصوى {value} منخفض قد يشير لمشاكل",
+        False: "معدل ضربات القلب القصوى {value} صحي"
+    },
+    'exang': {
+        True: "الإصابة بذبحة صدرية أثناء التمرين تزيد المخاطر",
+        False: "عدم الإصابة بذبحة صدرية أثناء التمرين علامة إيجابية"
     }
+}
+
+for _feature in feature_names:
+    DESCRIPTION_TEMPLATES.setdefault(_feature, {
+        True: f"العامل {feature_names_ar[_feature]} يزيد من المخاطر",
+        False: f"العامل {feature_names_ar[_feature]} يقلل من المخاطر"
+    })
+
+# الميزات ذات القيم الصحيحة (كل الميزات عدا انخفاض ST)
+INTEGER_FEATURES = set(feature_names) - {'oldpeak'}
+
+# حدود طلبات "ماذا لو" للحفاظ على زمن استجابة تفاعلي
+WHAT_IF_MAX_STEPS = int(os.environ.get('WHAT_IF_MAX_STEPS', 50))
+WHAT_IF_MAX_POINTS = int(os.environ.get('WHAT_IF_MAX_POINTS', 2500))
+
+# زمن تجهيز النموذج والمفسر وذروة الذاكرة بعده (أي بعد أول تنبؤ وتفسير)
+WARMUP_STATS = {}
+
+# مصفوفة مدخلات معدة مسبقاً لكل thread
+request_buffers = threading.local()
+
+# مسارات ملفات النموذج
+MODEL_PATH = os.environ.get('MODEL_PATH', 'models/heart_disease_model.pkl')
+SCALER_PATH = os.environ.get('SCALER_PATH', 'models/scaler.pkl')
+
+# التحليلات المحسوبة مسبقاً والعينة المرجعية المحفوظة مع النموذج
+ANALYTICS_PATH = os.environ.get('ANALYTICS_PATH', 'models/population_analytics.json')
+REFERENCE_SAMPLE_PATH = os.environ.get('REFERENCE_SAMPLE_PATH', 'models/reference_sample.npy')
+ANALYTICS_CACHE_CONTROL = 'public, max-age=3600'
+
+# النموذج البديل الرخيص (المسار المتدرج)
+SURROGATE_PATH = os.environ.get('SURROGATE_PATH', 'models/surrogate.json')
+
+# النسخة المضغوطة المُقلّمة من نموذج الأشجار وأكبر فرق مسموح عن النموذج الكامل
+COMPACT_MODEL_PATH = os.environ.get('COMPACT_MODEL_PATH', 'models/compact_model.npz')
+COMPACT_PARITY_TOLERANCE = 1e-6
+# التقييم المضغوط أسرع للطلبات الصغيرة فقط، والدفعات الكبيرة أسرع في النموذج الكامل
+COMPACT_MAX_ROWS = int(os.environ.get('COMPACT_MAX_ROWS', 8))
+
+# مفتاح توقيع رموز إعادة التقييم التدريجي: RESCORE_SECRET (مطلوب إذا تعددت النسخ)،
+# وإلا مفتاح عشوائي في RESCORE_SECRET_PATH (مجلد logs القابل للكتابة) يتشاركه عمال نفس الخادم
+RESCORE_SECRET = os.environ.get('RESCORE_SECRET')
+RESCORE_SECRET_PATH = os.environ.get('RESCORE_SECRET_PATH', 'logs/rescore_secret')
+
+# محلل الأداء بالعينات (يبقى مفعلاً في الإنتاج لأن تكلفته منخفضة)
+profiler = SamplingProfiler(
+    interval_ms=float(os.environ.get('PROFILER_INTERVAL_MS', 10)),
+    slow_threshold_ms=float(os.environ.get('PROFILER_SLOW_MS', 500)),
+    profile_dir=os.environ.get('PROFILER_DIR', 'logs/profiles'),
+    max_profiles=int(os.environ.get('PROFILER_MAX_PROFILES', 50)),
+    enabled=os.environ.get('PROFILER_ENABLED', 'true').lower() == 'true'
+)
+PROFILE_ID_PATTERN = re.compile(r'^(live|\d+-\d+-\d+)$')
+
+# مفتاح الوصول لـ endpoints الإدارة (معطلة إذا لم يُحدد)
+ADMIN_API_KEY = os.environ.get('API_KEY')
+
+# سجل النتائج المؤكدة (append-only) المستخدم في إعادة التدريب التدريجي
+FEEDBACK_LOG_PATH = os.environ.get('FEEDBACK_LOG_PATH', 'logs/feedback_outcomes.jsonl')
+feedback_lock = threading.Lock()
+
+# سجل تدقيق التنبؤات (SQLite بكتابة مجمعة في الخلفية) في مجلد logs القابل للكتابة
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///logs/audit.db')
+audit_log = AuditLog(
+    sqlite_path(DATABASE_URL),
+    max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 500)),
+    flush_interval_ms=float(os.environ.get('AUDIT_FLUSH_MS', 200)),
+    block_ms=float(os.environ.get('AUDIT_BLOCK_MS', 50)),
+    enabled=os.environ.get('AUDIT_ENABLED', 'true').lower() == 'true'
+)
+if sqlite_path(DATABASE_URL) is None:
+    logger.warning("DATABASE_URL ليس قاعدة SQLite، تم تعطيل سجل التدقيق")
+# الجداول تُنشأ عند البدء حتى يعمل /admin/predictions قبل أول تنبؤ
+audit_log.create_schema()
+AUDIT_MAX_LIMIT = 1000
+
+# تقسيم الدفعات الكبيرة على خيوط حصة العامل
+batch_executor = ChunkedExecutor(THREAD_BUDGET['threads_per_worker'])
+
+def create_explainer(background=None):
+    """اختيار مفسر مناسب لعائلة النموذج (خطي دقيق، TreeSHAP، أو KernelSHAP بخلفية ملخصة)"""
+    if background is None and os.path.exists(REFERENCE_SAMPLE_PATH):
+        background = np.load(REFERENCE_SAMPLE_PATH)[:100]
+        if scaler is not None:
+            background = scaler.transform(background)
     
-    df = pd.DataFrame(data)
+    if background is None and model_family(model) == 'kernel':
+        logger.info("لا توجد بيانات خلفية لمفسر KernelSHAP، سيتم استخدام التفسير المبسط")
+        return None
     
-    # إنشاء المتغير التابع بناءً على القواعد الطبية
-    target = np.zeros(n_samples)
-    for i in range(n_samples):
-        risk_score = 0
-        
-        # العمر
-        if df.loc[i, 'age'] > 65: risk_score += 3
-        elif df.loc[i, 'age'] > 55: risk_score += 2
-        elif df.loc[i, 'age'] > 45: risk_score += 1
-        
-        # الجنس (الرجال أكثر عرضة)
-        if df.loc[i, 'sex'] == 1: risk_score += 1
-        
-        # نوع ألم الصدر
-        if df.loc[i, 'cp'] == 1: risk_score += 3  # ألم ذبحة نموذجي
-        elif df.loc[i, 'cp'] == 2: risk_score += 2  # ألم ذبحة غير نموذجي
-        elif df.loc[i, 'cp'] == 0: risk_score += 1  # لا ألم
-        
-        # ضغط الدم
-        if df.loc[i, 'trestbps'] > 160: risk_score += 3
-        elif df.loc[i, 'trestbps'] > 140: risk_score += 2
-        elif df.loc[i, 'trestbps'] > 120: risk_score += 1
-        
-        # الكولسترول
-        if df.loc[i, 'chol'] > 280: risk_score += 2
-        elif df.loc[i, 'chol'] > 240: risk_score += 1
-        
-        # سكر الدم
-        if df.loc[i, 'fbs'] == 1: risk_score += 1
-        
-        # معدل ضربات القلب القصوى
-        if df.loc[i, 'thalach'] < 120: risk_score += 2
-        elif df.loc[i, 'thalach'] < 140: risk_score += 1
-        
-        # العوامل الأخرى
-        if df.loc[i, 'exang'] == 1: risk_score += 2
-        if df.loc[i, 'oldpeak'] > 3: risk_score += 2
-        elif df.loc[i, 'oldpeak'] > 1: risk_score += 1
-        
-        risk_score += df.loc[i, 'ca']  # عدد الأوعية
+    return select_explainer(model, background)
+
+def create_rescoring():
+    """تحضير إعادة التقييم التدريجي (تتطلب النسخة المضغوطة من نموذج الأشجار)"""
+    if compact_model is None:
+        return None
+    
+    try:
+        secret = RESCORE_SECRET.encode('utf-8') if RESCORE_SECRET else shared_secret(RESCORE_SECRET_PATH)
+    except OSError as e:
+        logger.warning(f"تعذر تحضير مفتاح توقيع إعادة التقييم، تم تعطيلها: {e}")
+        return None
+    return Rescorer(compact_model, secret, len(feature_names))
+
+def refresh_model_cache():
+    """حساب القيم الثابتة للنموذج مرة واحدة بدلاً من كل طلب"""
+    global model_importances, model_version
+    
+    # feature_importances_ في نماذج الأشجار تُحسب من جميع الأشجار عند كل وصول
+    model_importances = getattr(model, 'feature_importances_', None)
+    
+    # إصدار النموذج: بصمة ملفه المحفوظ
+    with open(MODEL_PATH, 'rb') as f:
+        model_version = hashlib.sha256(f.read()).hexdigest()[:16]
+
+def apply_thread_budget():
+    """تشغيل النموذج بخيط واحد لكل استدعاء وتطبيق الحد على مكتبات الخيوط المحمّلة"""
+    pin_model_threads(model)
+    THREAD_BUDGET['native_pools'] = limit_loaded_pools(1)
+
+def load_population_analytics(reference=None):
+    """تحميل التحليلات المحسوبة مسبقاً للنموذج الحالي أو حسابها مرة واحدة من العينة المرجعية"""
+    global population_analytics
+    population_analytics = {}
+    
+    analytics = None
+    try:
+        with open(ANALYTICS_PATH, encoding='utf-8') as f:
+            analytics = json.load(f)
+        if analytics.get('model_version') != model_version:
+            analytics = None
+    except (OSError, ValueError):
+        analytics = None
+    
+    if analytics is None:
+        if reference is None and os.path.exists(REFERENCE_SAMPLE_PATH):
+            reference = np.load(REFERENCE_SAMPLE_PATH)
+        if reference is None:
+            logger.info("لا توجد عينة مرجعية، لن تتوفر تحليلات المجتمع")
+            return
         
-        if df.loc[i, 'thal'] == 2: risk_score += 2
+        started = time.perf_counter()
+        analytics = compute_population_analytics(score_matrix, reference, feature_names, INTEGER_FEATURES)
+        analytics['model_version'] = model_version
+        analytics['computed_at'] = datetime.now().isoformat()
+        logger.info(f"تم حساب تحليلات المجتمع في {time.perf_counter() - started:.2f} ثانية")
         
-        # إضافة عشوائية للواقعية
-        final_score = risk_score + np.random.normal(0, 1.5)
-        target[i] = 1 if final_score > 6 else 0
+        # حفظها بجانب النموذج حتى لا تُحسب مرة أخرى (قد يكون المجلد للقراءة فقط)؛
+        # ملف مؤقت لكل عملية لأن عمال gunicorn قد يحسبونها ويكتبونها في نفس الوقت
+        tmp_path = f"{ANALYTICS_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(analytics, f, ensure_ascii=False)
+            os.replace(tmp_path, ANALYTICS_PATH)
+        except OSError as e:
+            logger.warning(f"تعذر حفظ تحليلات المجتمع: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    # ترميز كل قسم مرة واحدة مع ETag ثابت
+    for section in ('partial_dependence', 'risk_distribution', 'attributions'):
+        body = encode_json({'model_version': model_version, section: analytics[section]})
+        population_analytics[section] = (body, hashlib.sha256(body).hexdigest()[:32])
+    # computed_at يختلف بين العمال الذين حسبوا التحليلات بأنفسهم، فلا يدخل في ETag
+    content = encode_json({key: value for key, value in analytics.items() if key != 'computed_at'})
+    population_analytics['all'] = (encode_json(analytics), hashlib.sha256(content).hexdigest()[:32])
+
+def load_surrogate():
+    """تحميل النموذج البديل المُقطّر إذا كان مطابقاً للنموذج المحمّل"""
+    global surrogate
+    surrogate = None
+    
+    # النسخة المضغوطة تعطي احتمالية النموذج الكامل نفسها بتكلفة مقاربة، فلا حاجة للبديل معها
+    if compact_model is not None:
+        if os.path.exists(SURROGATE_PATH):
+            logger.info("النسخة المضغوطة محمّلة، لن يُستخدم النموذج البديل")
+        return
+    
+    try:
+        with open(SURROGATE_PATH, encoding='utf-8') as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logger.warning(f"فشل في تحميل النموذج البديل: {e}")
+        return
+    
+    if info.get('model_type') != type(model).__name__ or info.get('feature_names') != feature_names:
+        logger.warning("النموذج البديل لا يطابق النموذج المحمّل، سيتم استخدام النموذج الكامل فقط")
+        return
+    
+    surrogate = {
+        'coef': np.array(info['coef'], dtype=float),
+        'intercept': float(info['intercept']),
+        'margin': float(info['margin']),
+        'boundaries': tuple(info['boundaries'])
+    }
+    logger.info(f"تم تحميل النموذج البديل (نسبة التصعيد المتوقعة: {info.get('escalation_rate', 0):.3f})")
+
+def load_compact_model():
+    """تحميل النسخة المضغوطة من نموذج الأشجار بعد التحقق من تطابقها معه على النطاق الصحيح"""
+    global compact_model
+    compact_model = None
     
-    df['target'] = target.astype(int)
-    logger.info(f"تم إنشاء {len(df)} عينة")
-    logger.info(f"توزيع الفئات: {df['target'].value_counts().to_dict()}")
+    try:
+        compact = CompactTrees.load(COMPACT_MODEL_PATH)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"فشل في تحميل النسخة المضغوطة: {e}")
+        return
+    
+    if compact.model_version != model_version:
+        logger.warning("النسخة المضغوطة لا تطابق النموذج المحمّل، سيتم استخدام النموذج الكامل")
+        return
+    
+    X = domain_sample(feature_names, FEATURE_RANGES, INTEGER_FEATURES)
+    if scaler is not None:
+        X = scaler.transform(X)
+    error = float(np.abs(compact.predict_positive(X) - model.predict_proba(X)[:, 1]).max())
+    if error > COMPACT_PARITY_TOLERANCE:
+        logger.warning(f"النسخة المضغوطة لا تطابق مخرجات النموذج (أكبر فرق {error:.2e})، سيتم تجاهلها")
+        return
+    
+    compact_model = compact
+    logger.info(f"تم تحميل النسخة المضغوطة ({compact.n_trees} شجرة، {compact.n_nodes} عقدة، أكبر فرق {error:.1e})")
+
+def predict_positive(X_scaled):
+    """احتمالية المرض لصفوف مطبّعة (من النسخة المضغوطة للدفعات الصغيرة إن توفرت)"""
+    if compact_model is not None and len(X_scaled) <= COMPACT_MAX_ROWS:
+        return compact_model.predict_positive(X_scaled)
+    
+    # التوازي داخل الطلب للدفعات الكبيرة فقط (شبكات ماذا لو وتحليلات المجتمع)
+    if len(X_scaled) >= THREAD_BUDGET['parallel_min_rows'] and batch_executor.threads > 1:
+        return np.concatenate(batch_executor.map_rows(lambda chunk: model.predict_proba(chunk)[:, 1], X_scaled))
+    return model.predict_proba(X_scaled)[:, 1]
+
+def surrogate_probability(row):
+    """احتمالية النموذج البديل، أو None إذا عبر نطاق ثقتها أحد حدود مستويات الخطر"""
+    center = float(np.dot(surrogate['coef'], row)) + surrogate['intercept']
+    center = min(max(center, -50.0), 50.0)
+    low = 1 / (1 + math.exp(-(center - surrogate['margin'])))
+    high = 1 / (1 + math.exp(-(center + surrogate['margin'])))
     
-    return df
+    for boundary in surrogate['boundaries']:
+        if low <= boundary <= high:
+            return None
+    
+    return 1 / (1 + math.exp(-center))
+
+def warm_up():
+    """تنبؤ وتفسير لصف تجريبي عند تحميل النموذج: استيراد shap وبناء المفسر يتمان هنا
+    (بعد fork في كل عامل) بدلاً من أول طلب حقيقي"""
+    started = time.perf_counter()
+    row = np.array([[(min_val + max_val) / 2 for min_val, max_val in FEATURE_RANGES.values()]])
+    row_scaled = scaler.transform(row) if scaler is not None else row
+    predict_positive(row_scaled)
+    if explainer is not None:
+        try:
+            explainer.shap_values(row_scaled)
+        except Exception as e:
+            logger.warning(f"فشل في تجهيز المفسر: {e}")
+    
+    WARMUP_STATS.update({
+        'seconds': round(time.perf_counter() - started, 3),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+    logger.info(f"تم تجهيز النموذج والمفسر في {WARMUP_STATS['seconds']:.2f} ثانية")
 
 def train_model():
     """تدريب النموذج"""
-    global model, scaler, explainer
+    global model, scaler, explainer, surrogate, compact_model, rescoring
     
     try:
         # محاولة تحميل النموذج المحفوظ
-        if os.path.exists('models/heart_disease_model.pkl') and os.path.exists('models/scaler.pkl'):
-            model = joblib.load('models/heart_disease_model.pkl')
-            scaler = joblib.load('models/scaler.pkl')
+        if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
+            model = joblib.load(MODEL_PATH)
+            scaler = joblib.load(SCALER_PATH)
+            refresh_model_cache()
+            apply_thread_budget()
+            load_compact_model()
+            load_surrogate()
+            load_population_analytics()
+            
+            try:
+                explainer = create_explainer()
+            except Exception as e:
+                logger.warning(f"فشل في تحضير SHAP explainer: {e}")
+                explainer = None
+            
+            rescoring = create_rescoring()
+            warm_up()
             logger.info("تم تحميل النموذج المحفوظ بنجاح")
             return True
     except Exception as e:
@@ -140,56 +448,33 @@ def train_model():
     try:
         logger.info("بدء تدريب نموذج جديد...")
         
-        # إنشاء البيانات
-        df = create_synthetic_data()
-        
-        # تحضير البيانات
-        X = df[feature_names]
-        y = df['target']
-        
-        # تقسيم البيانات
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
-        )
-        
-        # تطبيع البيانات
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        
-        # تدريب النموذج
-        model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        
-        model.fit(X_train_scaled, y_train)
+        # استيراد متأخر: أدوات التدريب (pandas و sklearn) ليست جزءاً من مسار الخدمة
+        from training import train_fallback_model
         
-        # تقييم النموذج
-        train_score = model.score(X_train_scaled, y_train)
-        test_score = model.score(X_test_scaled, y_test)
-        
-        logger.info(f"دقة التدريب: {train_score:.3f}")
-        logger.info(f"دقة الاختبار: {test_score:.3f}")
+        model, scaler, X_train_scaled = train_fallback_model(feature_names)
+        surrogate = None
+        compact_model = None
+        rescoring = None
         
         # إنشاء مجلد النماذج إذا لم يكن موجوداً
-        os.makedirs('models', exist_ok=True)
+        os.makedirs(os.path.dirname(MODEL_PATH) or '.', exist_ok=True)
         
         # حفظ النموذج
-        joblib.dump(model, 'models/heart_disease_model.pkl')
-        joblib.dump(scaler, 'models/scaler.pkl')
+        joblib.dump(model, MODEL_PATH)
+        joblib.dump(scaler, SCALER_PATH)
         
         # تحضير SHAP explainer
         try:
-            explainer = shap.Explainer(model, X_train_scaled[:100])
-            logger.info("تم تحضير SHAP explainer بنجاح")
+            explainer = create_explainer(X_train_scaled[:100])
+            logger.info(f"تم تحضير SHAP explainer بنجاح ({explainer.family})")
         except Exception as e:
             logger.warning(f"فشل في تحضير SHAP explainer: {e}")
             explainer = None
         
+        refresh_model_cache()
+        apply_thread_budget()
+        load_population_analytics(reference=scaler.inverse_transform(X_train_scaled[:1000]))
+        warm_up()
         logger.info("تم تدريب النموذج بنجاح")
         return True
         
@@ -199,35 +484,35 @@ def train_model():
 
 def validate_input(data):
     """التحقق من صحة البيانات المدخلة"""
-    required_fields = feature_names
-    
-    for field in required_fields:
-        if field not in data:
-            return False, f"الحقل المطلوب '{field}' مفقود"
+    for feature in feature_names:
+        if feature not in data:
+            return False, MISSING_FIELD_ERRORS[feature]
     
     # التحقق من النطاقات
-    validations = {
-        'age': (1, 120),
-        'sex': (0, 1),
-        'cp': (0, 3),
-        'trestbps': (80, 250),
-        'chol': (100, 600),
-        'fbs': (0, 1),
-        'restecg': (0, 2),
-        'thalach': (60, 220),
-        'exang': (0, 1),
-        'oldpeak': (0, 10),
-        'slope': (0, 2),
-        'ca': (0, 4),
-        'thal': (1, 3)
-    }
+    for feature, _, min_val, max_val in FEATURE_BOUNDS:
+        if not (min_val <= data[feature] <= max_val):
+            return False, RANGE_ERRORS[feature]
+    
+    return True, "البيانات صحيحة"
+
+def parse_input(data):
+    """التحقق من البيانات وكتابتها مباشرة في مصفوفة المدخلات المعدة مسبقاً"""
+    for feature in feature_names:
+        if feature not in data:
+            return None, MISSING_FIELD_ERRORS[feature]
+    
+    features = getattr(request_buffers, 'features', None)
+    if features is None:
+        features = request_buffers.features = np.empty((1, len(feature_names)))
     
-    for field, (min_val, max_val) in validations.items():
-        value = data[field]
+    row = features[0]
+    for feature, index, min_val, max_val in FEATURE_BOUNDS:
+        value = data[feature]
         if not (min_val <= value <= max_val):
-            return False, f"قيمة {feature_names_ar.get(field, field)} يجب أن تكون بين {min_val} و {max_val}"
+            return None, RANGE_ERRORS[feature]
+        row[index] = value
     
-    return True, "البيانات صحيحة"
+    return features, None
 
 def get_risk_level(probability):
     """تحديد مستوى الخطر بناءً على الاحتمالية"""
@@ -240,43 +525,27 @@ def get_risk_level(probability):
 
 def get_feature_description(feature, value, increases_risk):
     """وصف تأثير كل ميزة"""
-    descriptions = {
-        'age': {
-            True: f"العمر {int(value)} سنة يزيد من مخاطر أمراض القلب مع التقدم في السن",
-            False: f"العمر {int(value)} سنة ضمن النطاق الآمن نسبياً"
-        },
-        'sex': {
-            True: "الجنس الذكري يرتبط بمخاطر أعلى لأمراض القلب",
-            False: "الجنس الأنثوي يرتبط بمخاطر أقل نسبياً"
-        },
-        'cp': {
-            True: f"نوع ألم الصدر ({int(value)}) يشير لمخاطر قلبية",
-            False: f"نوع ألم الصدر ({int(value)}) أقل ارتباطاً بمشاكل القلب"
-        },
-        'trestbps': {
-            True: f"ضغط الدم {int(value)} مرتفع ويزيد المخاطر القلبية",
-            False: f"ضغط الدم {int(value)} ضمن المعدل الطبيعي"
-        },
-        'chol': {
-            True: f"مستوى الكولسترول {int(value)} مرتفع ويؤثر على صحة القلب",
-            False: f"مستوى الكولسترول {int(value)} ضمن المعدل المقبول"
-        },
-        'thalach': {
-            True: f"معدل ضربات القلب القصوى {int(value)} منخفض قد يشير لمشاكل",
-            False: f"معدل ضربات القلب القصوى {int(value)} صحي"
-        },
-        'exang': {
-            True: "الإصابة بذبحة صدرية أثناء التمرين تزيد المخاطر",
-            False: "عدم الإصابة بذبحة صدرية أثناء التمرين علامة إيجابية"
-        }
-    }
+    templates = DESCRIPTION_TEMPLATES.get(feature)
+    if templates is None:
+        direction = 'يزيد من المخاطر' if increases_risk else 'يقلل من المخاطر'
+        return f"العامل {feature} {direction}"
     
-    default_desc = {
-        True: f"العامل {feature_names_ar.get(feature, feature)} يزيد من المخاطر",
-        False: f"العامل {feature_names_ar.get(feature, feature)} يقلل من المخاطر"
-    }
+    return templates[bool(increases_risk)].format(value=int(value))
+
+def encode_json(payload):
+    """ترميز JSON إلى bytes بمفاتيح مرتبة (orjson إن كان متوفراً)"""
+    if orjson is None:
+        return json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+def json_response(payload, status=200):
+    """ترميز الاستجابة بـ orjson إن كان متوفراً (بنفس ترتيب مفاتيح jsonify)"""
+    if orjson is None:
+        response = jsonify(payload)
+        response.status_code = status
+        return response
     
-    return descriptions.get(feature, default_desc).get(increases_risk, f"قيمة {feature}: {value}")
+    return app.response_class(encode_json(payload), status=status, mimetype='application/json')
 
 def explain_prediction(model_input):
     """تفسير التنبؤ باستخدام feature importance أو SHAP"""
@@ -284,14 +553,17 @@ def explain_prediction(model_input):
     
     try:
         if explainer is not None:
-            # استخدام SHAP للتفسير
-            shap_values = explainer(model_input.reshape(1, -1))
-            feature_importance = list(zip(feature_names, shap_values.values[0]))
+            # استخدام SHAP للتفسير على القيم المطبّعة (كما تدرّب النموذج)
+            model_input_scaled = model_input.reshape(1, -1)
+            if scaler is not None:
+                model_input_scaled = scaler.transform(model_input_scaled)
+            shap_values = explainer.shap_values(model_input_scaled)
+            feature_importance = list(zip(feature_names, shap_values[0]))
         else:
             # استخدام feature importance من النموذج
-            if hasattr(model, 'feature_importances_'):
+            if model_importances is not None:
                 # حساب تأثير كل ميزة بناءً على قيمتها وأهميتها
-                importances = model.feature_importances_
+                importances = model_importances
                 feature_importance = []
                 
                 for i, feature in enumerate(feature_names):
@@ -327,7 +599,7 @@ def explain_prediction(model_input):
                 'direction': 'يزيد الخطر' if increases_risk else 'يقلل الخطر',
                 'description': get_feature_description(
                     feature, 
-                    model_input[feature_names.index(feature)], 
+                    model_input[FEATURE_INDEX[feature]], 
                     increases_risk
                 )
             })
@@ -348,6 +620,33 @@ def explain_prediction(model_input):
         ]
         return basic_factors
 
+def worker_stats():
+    """زمن استيراد التطبيق وذروة الذاكرة في العامل الحالي"""
+    return {
+        'pid': os.getpid(),
+        'import_seconds': round(IMPORT_SECONDS, 3),
+        'warmup': WARMUP_STATS,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+@app.before_request
+def start_request_profile():
+    """تسجيل بداية الطلب لدى محلل الأداء"""
+    profiler.begin_request(f"{request.method} {request.path}")
+
+@app.teardown_request
+def finish_request_profile(exc):
+    """إنهاء الطلب وحفظ ملف تعريفه إذا تجاوز حد البطء"""
+    duration_ms = profiler.end_request()
+    if duration_ms is not None and duration_ms >= profiler.slow_threshold_ms:
+        logger.warning("طلب بطيء: %s %s استغرق %.0f ms", request.method, request.path, duration_ms)
+
+def admin_authorized():
+    """التحقق من مفتاح الإدارة في ترويسة X-API-Key"""
+    return bool(ADMIN_API_KEY) and hmac.compare_digest(
+        request.headers.get('X-API-Key', '').encode('utf-8'), ADMIN_API_KEY.encode('utf-8')
+    )
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """فحص حالة الخدمة"""
@@ -356,6 +655,11 @@ def health_check():
         'model_loaded': model is not None,
         'scaler_loaded': scaler is not None,
         'explainer_loaded': explainer is not None,
+        'explainer': explainer.family if explainer is not None else None,
+        'compact_model': compact_model is not None,
+        'worker': worker_stats(),
+        'threads': THREAD_BUDGET,
+        'audit': audit_log.stats(),
         'timestamp': datetime.now().isoformat(),
         'version': '1.0.0'
     })
@@ -363,6 +667,7 @@ def health_check():
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """endpoint للتنبؤ بخطر أمراض القلب"""
+    started = time.perf_counter()
     try:
         # التحقق من وجود النموذج
         if model is None:
@@ -374,25 +679,35 @@ def predict():
         
         if not data:
             return jsonify({'error': 'لم يتم إرسال بيانات'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'يجب إرسال البيانات ككائن JSON'}), 400
         
-        logger.info(f"تم استلام طلب تنبؤ: {data}")
+        logger.info("تم استلام طلب تنبؤ: %s", data)
         
-        # التحقق من صحة البيانات
-        is_valid, message = validate_input(data)
-        if not is_valid:
+        # التحقق من صحة البيانات وتحضيرها للتنبؤ
+        features, message = parse_input(data)
+        if features is None:
             return jsonify({'error': message}), 400
         
-        # تحضير البيانات للتنبؤ
-        features = np.array([[data[feature] for feature in feature_names]])
-        
-        # تطبيق التطبيع
-        if scaler is not None:
-            features_scaled = scaler.transform(features)
-        else:
-            features_scaled = features
+        handle = None
+        prediction_proba = None
+        if data.get('rescorable') is True and rescoring is not None:
+            # بطلب العميل فقط: تقييم كامل بالنسخة المضغوطة مع رمز حالة لـ /api/rescore
+            features_scaled = scaler.transform(features) if scaler is not None else features
+            handle, prediction_proba = rescoring.create(features[0], features_scaled[0])
+        elif surrogate is not None:
+            # المسار المتدرج: النموذج البديل أولاً، والنموذج الكامل فقط قرب حدود مستويات الخطر
+            prediction_proba = surrogate_probability(features[0])
         
-        # التنبؤ
-        prediction_proba = model.predict_proba(features_scaled)[0][1]
+        if prediction_proba is None:
+            # تطبيق التطبيع
+            if scaler is not None:
+                features_scaled = scaler.transform(features)
+            else:
+                features_scaled = features
+            
+            # التنبؤ
+            prediction_proba = predict_positive(features_scaled)[0]
         prediction = 1 if prediction_proba > 0.5 else 0
         risk_level = get_risk_level(prediction_proba)
         
@@ -407,16 +722,258 @@ def predict():
             'factors': factors,
             'timestamp': datetime.now().isoformat()
         }
+        if handle is not None:
+            result['handle'] = handle
         
         # تسجيل النتيجة
-        logger.info(f"تنبؤ مكتمل: احتمالية = {prediction_proba:.3f}, مستوى الخطر = {risk_level}")
+        logger.info("تنبؤ مكتمل: احتمالية = %.3f, مستوى الخطر = %s", prediction_proba, risk_level)
+        audit_log.record(
+            {feature: data[feature] for feature in feature_names}, result['probability'],
+            result['prediction'], risk_level, model_version, (time.perf_counter() - started) * 1000
+        )
         
-        return jsonify(result)
+        return json_response(result)
         
     except Exception as e:
         logger.error(f"خطأ في التنبؤ: {e}")
         return jsonify({'error': 'حدث خطأ في معالجة الطلب'}), 500
 
+@app.route('/api/rescore', methods=['POST'])
+def rescore():
+    """endpoint لإعادة تقييم تنبؤ سابق بعد تغيير بعض الميزات (الأشجار المتأثرة فقط)"""
+    started = time.perf_counter()
+    try:
+        if rescoring is None:
+            return jsonify({'error': 'إعادة التقييم التدريجي غير متوفرة لهذا النموذج'}), 404
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'لم يتم إرسال بيانات'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'يجب إرسال البيانات ككائن JSON'}), 400
+        
+        handle, changes = data.get('handle'), data.get('changes')
+        if not isinstance(handle, str) or not isinstance(changes, dict) or not changes:
+            return jsonify({'error': "الحقلان 'handle' و 'changes' مطلوبان"}), 400
+        
+        state, problem = rescoring.decode(handle)
+        if problem == 'stale':
+            return jsonify({'error': 'تم تحديث النموذج منذ هذا التنبؤ، يرجى إرسال التنبؤ كاملاً'}), 409
+        if state is None:
+            return jsonify({'error': "الحقل 'handle' غير صالح"}), 400
+        
+        row = state['row'].copy()
+        for feature, value in changes.items():
+            if feature not in FEATURE_RANGES:
+                return jsonify({'error': f"الميزة '{feature}' غير معروفة"}), 400
+            min_val, max_val = FEATURE_RANGES[feature]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not (min_val <= value <= max_val):
+                return jsonify({'error': RANGE_ERRORS[feature]}), 400
+            row[FEATURE_INDEX[feature]] = value
+        
+        row_scaled = scaler.transform(row.reshape(1, -1))[0] if scaler is not None else row
+        outcome = rescoring.rescore(state, row, row_scaled)
+        
+        probability = outcome['probability']
+        prediction = 1 if probability > 0.5 else 0
+        risk_level = get_risk_level(probability)
+        
+        result = {
+            'probability': probability,
+            'prediction': prediction,
+            'risk_level': risk_level,
+            'handle': outcome['handle'],
+            'rescored': {
+                'changed_features': [feature_names[i] for i in outcome['changed_features']],
+                'trees': outcome['trees_rescored'],
+                'n_trees': compact_model.n_trees
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+        # تفسير SHAP الكامل يكلف أضعاف إعادة التقييم نفسها، فيُحسب فقط بطلب العميل
+        if data.get('explain') is True:
+            result['factors'] = explain_prediction(row)
+        
+        logger.info("إعادة تقييم مكتملة: احتمالية = %.3f, أشجار معاد تقييمها = %d/%d",
+                    probability, outcome['trees_rescored'], compact_model.n_trees)
+        audit_log.record(
+            {feature: (int(value) if feature in INTEGER_FEATURES else float(value))
+             for feature, value in zip(feature_names, row)},
+            probability, prediction, risk_level, model_version, (time.perf_counter() - started) * 1000
+        )
+        
+        return json_response(result)
+        
+    except Exception as e:
+        logger.error(f"خطأ في إعادة التقييم: {e}")
+        return jsonify({'error': 'حدث خطأ في معالجة الطلب'}), 500
+
+def parse_what_if_axes(vary):
+    """تحويل نطاقات الميزات المطلوب تغييرها إلى قيم الشبكة ضمن حدود validate_input"""
+    if not isinstance(vary, dict) or not 1 <= len(vary) <= 2:
+        return None, "الحقل 'vary' يجب أن يحدد ميزة أو ميزتين"
+    
+    axes = []
+    for feature, spec in vary.items():
+        if feature not in FEATURE_RANGES:
+            return None, f"الميزة '{feature}' غير معروفة"
+        
+        min_val, max_val = FEATURE_RANGES[feature]
+        if spec is None:
+            spec = {}
+        if not isinstance(spec, dict):
+            return None, f"نطاق الميزة '{feature}' يجب أن يكون كائناً بالحقول min و max و steps"
+        low = spec.get('min', min_val)
+        high = spec.get('max', max_val)
+        steps = spec.get('steps', 21)
+        
+        if any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in (low, high)):
+            return None, f"القيمتان min و max للميزة '{feature}' يجب أن تكونا أرقاماً"
+        if not (min_val <= low <= high <= max_val):
+            return None, RANGE_ERRORS[feature]
+        if isinstance(steps, bool) or not isinstance(steps, int) or not 2 <= steps <= WHAT_IF_MAX_STEPS:
+            return None, f"عدد الخطوات يجب أن يكون بين 2 و {WHAT_IF_MAX_STEPS}"
+        
+        values = np.linspace(low, high, steps)
+        if feature in INTEGER_FEATURES:
+            values = np.unique(np.round(values))
+        axes.append((feature, values))
+    
+    if np.prod([len(values) for _, values in axes]) > WHAT_IF_MAX_POINTS:
+        return None, f"عدد نقاط الشبكة يتجاوز الحد المسموح ({WHAT_IF_MAX_POINTS})"
+    
+    return axes, None
+
+def score_matrix(X):
+    """تقييم مصفوفة حالات كاملة بتمرير واحد على النموذج"""
+    if scaler is not None:
+        X = scaler.transform(X)
+    return predict_positive(X)
+
+def risk_level_indices(probabilities):
+    """رقم مستوى الخطر لكل احتمالية (0 منخفض، 1 متوسط، 2 مرتفع)"""
+    return np.digitize(probabilities, RISK_BOUNDARIES)
+
+@app.route('/api/what_if', methods=['POST'])
+def what_if():
+    """endpoint لتقييم شبكة من السيناريوهات البديلة لمريض (ماذا لو) دفعة واحدة"""
+    try:
+        if model is None:
+            logger.error("النموذج غير محمّل")
+            return jsonify({'error': 'النموذج غير متوفر، يرجى المحاولة لاحقاً'}), 500
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'لم يتم إرسال بيانات'}), 400
+        if not isinstance(data, dict) or not isinstance(data.get('patient') or {}, dict):
+            return jsonify({'error': 'يجب إرسال البيانات والمريض ككائنات JSON'}), 400
+        
+        started = time.perf_counter()
+        
+        base, message = parse_input(data.get('patient') or {})
+        if base is None:
+            return jsonify({'error': message}), 400
+        base = base.copy()
+        
+        axes, message = parse_what_if_axes(data.get('vary'))
+        if axes is None:
+            return jsonify({'error': message}), 400
+        
+        # بناء الشبكة كاملة كمصفوفة واحدة: الصف الأول هو الحالة الأصلية
+        grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+        n_points = grids[0].size
+        X = np.repeat(base, n_points + 1, axis=0)
+        for (feature, _), grid in zip(axes, grids):
+            X[1:, FEATURE_INDEX[feature]] = grid.ravel()
+        
+        probabilities = score_matrix(X)
+        levels = risk_level_indices(probabilities)
+        base_probability, base_level = probabilities[0], levels[0]
+        surface = probabilities[1:].reshape(grids[0].shape)
+        
+        result = {
+            'features': [feature for feature, _ in axes],
+            'values': [values.tolist() for _, values in axes],
+            'probabilities': surface.tolist(),
+            'risk_levels': np.array(RISK_LEVELS)[levels[1:]].reshape(grids[0].shape).tolist(),
+            'base': {
+                'probability': float(base_probability),
+                'risk_level': RISK_LEVELS[base_level]
+            }
+        }
+        
+        # أصغر تغيير ينقل المريض إلى مستوى خطر أقل (المسافة منسوبة لمدى كل ميزة)
+        if data.get('search', True):
+            lower = np.flatnonzero(levels[1:] < base_level)
+            result['smallest_change'] = None
+            if lower.size:
+                distance = np.zeros(lower.size)
+                for (feature, _), grid in zip(axes, grids):
+                    min_val, max_val = FEATURE_RANGES[feature]
+                    delta = grid.ravel()[lower] - base[0, FEATURE_INDEX[feature]]
+                    distance += np.abs(delta) / (max_val - min_val)
+                
+                best = lower[np.argmin(distance)]
+                result['smallest_change'] = {
+                    'changes': {
+                        feature: float(grid.ravel()[best]) for (feature, _), grid in zip(axes, grids)
+                    },
+                    'probability': float(probabilities[best + 1]),
+                    'risk_level': RISK_LEVELS[levels[best + 1]]
+                }
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        result['n_points'] = int(n_points)
+        result['elapsed_ms'] = round(elapsed_ms, 2)
+        logger.info("تحليل ماذا لو مكتمل: %d نقطة في %.1f ms", n_points, elapsed_ms)
+        
+        return json_response(result)
+        
+    except Exception as e:
+        logger.error(f"خطأ في تحليل ماذا لو: {e}")
+        return jsonify({'error': 'حدث خطأ في معالجة الطلب'}), 500
+
+@app.route('/api/feedback', methods=['POST'])
+def feedback():
+    """endpoint لتسجيل النتيجة المؤكدة لمريض في سجل إعادة التدريب"""
+    # كل سطر يصبح بيانات تدريب وتحقق للتحديث التدريجي، فالكتابة لحاملي مفتاح الإدارة فقط
+    if not admin_authorized():
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'لم يتم إرسال بيانات'}), 400
+        
+        # التحقق من صحة البيانات
+        is_valid, message = validate_input(data)
+        if not is_valid:
+            return jsonify({'error': message}), 400
+        
+        outcome = data.get('outcome')
+        if isinstance(outcome, bool) or outcome not in (0, 1):
+            return jsonify({'error': "الحقل 'outcome' يجب أن يكون 0 أو 1"}), 400
+        
+        record = {feature: data[feature] for feature in feature_names}
+        record['target'] = int(outcome)
+        record['timestamp'] = datetime.now().isoformat()
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        
+        # الإلحاق فقط (append-only): كتابة السطر دفعة واحدة حتى لا تتداخل الأسطر بين العمال
+        with feedback_lock:
+            os.makedirs(os.path.dirname(FEEDBACK_LOG_PATH) or '.', exist_ok=True)
+            with open(FEEDBACK_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(line)
+        
+        logger.info(f"تم تسجيل نتيجة مؤكدة: outcome = {record['target']}")
+        
+        return jsonify({'status': 'recorded', 'timestamp': record['timestamp']}), 201
+        
+    except Exception as e:
+        logger.error(f"خطأ في تسجيل النتيجة: {e}")
+        return jsonify({'error': 'حدث خطأ في تسجيل النتيجة'}), 500
+
 @app.route('/api/model_info', methods=['GET'])
 def model_info():
     """معلومات عن النموذج"""
@@ -445,10 +1002,109 @@ def model_info():
         logger.error(f"خطأ في جلب معلومات النموذج: {e}")
         return jsonify({'error': 'حدث خطأ في جلب المعلومات'}), 500
 
+@app.route('/api/analytics', methods=['GET'])
+@app.route('/api/analytics/<section>', methods=['GET'])
+def analytics_data(section='all'):
+    """تحليلات المجتمع المحسوبة مسبقاً (تُقدَّم من الذاكرة مع ETag)"""
+    if section not in ('all', 'partial_dependence', 'risk_distribution', 'attributions'):
+        return jsonify({'error': f"القسم '{section}' غير معروف"}), 404
+    
+    if section not in population_analytics:
+        return jsonify({'error': 'تحليلات المجتمع غير متوفرة لهذا النموذج'}), 404
+    
+    body, etag = population_analytics[section]
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = ANALYTICS_CACHE_CONTROL
+    return response.make_conditional(request)
+
+@app.route('/admin/predictions', methods=['GET'])
+def audit_history():
+    """أحدث التنبؤات من سجل التدقيق مع التصفية بمستوى الخطر أو إصدار النموذج أو الوقت"""
+    if not admin_authorized():
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    if not audit_log.enabled:
+        return jsonify({'error': 'سجل التدقيق غير مفعل'}), 404
+    
+    try:
+        limit = int(request.args.get('limit', 100))
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id is not None else None
+    except ValueError:
+        return jsonify({'error': "الحقلان 'limit' و 'before_id' يجب أن يكونا أعداداً صحيحة"}), 400
+    if not 1 <= limit <= AUDIT_MAX_LIMIT:
+        return jsonify({'error': f"الحقل 'limit' يجب أن يكون بين 1 و {AUDIT_MAX_LIMIT}"}), 400
+    
+    risk_level = request.args.get('risk_level')
+    if risk_level is not None and risk_level not in RISK_LEVELS:
+        return jsonify({'error': f"مستوى الخطر يجب أن يكون أحد: {', '.join(RISK_LEVELS)}"}), 400
+    
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = datetime.fromisoformat(since).isoformat()
+        except ValueError:
+            return jsonify({'error': "الحقل 'since' يجب أن يكون تاريخاً بصيغة ISO 8601"}), 400
+    
+    try:
+        records = audit_log.recent(
+            limit, risk_level=risk_level, model_version=request.args.get('model_version'),
+            since=since, before_id=before_id
+        )
+    except Exception as e:
+        logger.error(f"خطأ في قراءة سجل التدقيق: {e}")
+        return jsonify({'error': 'حدث خطأ في قراءة سجل التدقيق'}), 500
+    
+    return json_response({
+        'predictions': records,
+        'next_before_id': records[-1]['id'] if len(records) == limit else None,
+        'audit': audit_log.stats()
+    })
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """قائمة ملفات تعريف الطلبات البطيئة المحفوظة"""
+    if not admin_authorized():
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    return jsonify({
+        'enabled': profiler.enabled,
+        'interval_ms': profiler.interval_ms,
+        'slow_threshold_ms': profiler.slow_threshold_ms,
+        'profiles': profiler.list_profiles()
+    })
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def export_profile(profile_id):
+    """تصدير ملف تعريف (أو 'live' للملف التراكمي) بصيغة speedscope أو collapsed"""
+    if not admin_authorized():
+        return jsonify({'error': 'غير مصرح'}), 403
+    
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return jsonify({'error': 'معرف ملف التعريف غير صالح'}), 400
+    
+    profile = profiler.live_profile() if profile_id == 'live' else profiler.load_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'ملف التعريف غير موجود'}), 404
+    
+    export_format = request.args.get('format', 'speedscope')
+    if export_format == 'collapsed':
+        return Response(to_collapsed(profile['samples']), mimetype='text/plain')
+    if export_format != 'speedscope':
+        return jsonify({'error': "الصيغة يجب أن تكون 'speedscope' أو 'collapsed'"}), 400
+    
+    name = f"{profile['description']} ({profile['duration_ms']:.0f} ms)"
+    return jsonify(to_speedscope(profile['samples'], name, profile['interval_ms']))
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
 # تهيئة النموذج عند بدء التطبيق
 @app.before_first_request
 def initialize():
-    """تهيئة النموذج قبل أول طلب"""
+    """تهيئة النموذج قبل أول طلب (إذا لم يحمّله gunicorn.conf.py عند بدء العامل)"""
+    if model is not None:
+        return
     logger.info("تهيئة النموذج...")
     success = train_model()
     if success:
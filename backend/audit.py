@@ -0,0 +1,220 @@
+"""سجل تدقيق التنبؤات في SQLite بكتابة غير متزامنة ومجمعة
+
+الطلب يضيف السجل إلى طابور في الذاكرة فقط، وthread كاتب واحد لكل عامل يفرغ الطابور
+في معاملات كبيرة (group commit) بوضع WAL. عند امتلاء الطابور ينتظر الطلب مدة قصيرة
+(backpressure) ثم يُسقط السجل ويُحتسب في عداد dropped بدلاً من تعطيل التنبؤ.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    model_version TEXT,
+    probability REAL NOT NULL,
+    prediction INTEGER NOT NULL,
+    risk_level TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    inputs TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_risk_level ON predictions (risk_level);
+CREATE INDEX IF NOT EXISTS idx_predictions_model_version ON predictions (model_version);
+"""
+
+INSERT = """
+INSERT INTO predictions (created_at, model_version, probability, prediction, risk_level, latency_ms, inputs)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+COLUMNS = ('id', 'created_at', 'model_version', 'probability', 'prediction', 'risk_level', 'latency_ms', 'inputs')
+
+def sqlite_path(database_url):
+    """مسار ملف قاعدة البيانات من DATABASE_URL بصيغة sqlite:///path (أو None لغير SQLite)"""
+    prefix = 'sqlite:///'
+    if not database_url or not database_url.startswith(prefix):
+        return None
+    return database_url[len(prefix):]
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # مع WAL يكفي synchronous=NORMAL: لا يفسد القاعدة وقد يفقد آخر معاملة فقط عند انقطاع الكهرباء
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+class AuditLog:
+    """طابور سجلات التدقيق مع كاتب في الخلفية يكتبها على دفعات"""
+
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval_ms=200,
+                 block_ms=50, enabled=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.block_timeout = block_ms / 1000
+        self.enabled = enabled and path is not None
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.thread = None
+        self.pid = None
+
+    def create_schema(self):
+        """إنشاء قاعدة البيانات والجداول إذا لم تكن موجودة (يُستدعى عند بدء الخادم أيضاً)"""
+        if not self.enabled:
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = connect(self.path)
+            connection.executescript(SCHEMA)
+            connection.close()
+            return True
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"تعذر تهيئة سجل التدقيق في {self.path}: {e}")
+            self.enabled = False
+            return False
+
+    def start(self):
+        """إنشاء الجداول وتشغيل الكاتب مرة واحدة لكل عملية (بعد fork في gunicorn)"""
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+
+        if not self.create_schema():
+            return
+
+        self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record(self, inputs, probability, prediction, risk_level, model_version, latency_ms):
+        """إضافة سجل تنبؤ إلى الطابور (الترميز والكتابة تتم في thread الكاتب)"""
+        if not self.enabled:
+            return False
+        self.start()
+
+        item = (datetime.now().isoformat(), model_version, probability, prediction,
+                risk_level, latency_ms, inputs)
+        try:
+            self.queue.put(item, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # تحذير عند أول سجل مُسقط ثم كل 1000 حتى لا يغرق السجل أثناء الضغط
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"طابور سجل التدقيق ممتلئ، تم إسقاط {dropped} سجل حتى الآن")
+            return False
+
+    def run(self):
+        connection = connect(self.path)
+        while True:
+            # انتظار أول سجل ثم تجميع ما يصل خلال flush_interval في معاملة واحدة
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+
+            stop = batch[-1] is None
+            rows = [item[:-1] + (json.dumps(item[-1], ensure_ascii=False),) for item in batch if item is not None]
+            try:
+                if rows:
+                    with connection:
+                        connection.executemany(INSERT, rows)
+                with self.lock:
+                    self.written += len(rows)
+                    self.batches += 1
+            except sqlite3.Error as e:
+                logger.error(f"فشل في كتابة سجل التدقيق ({len(rows)} سجل): {e}")
+                with self.lock:
+                    self.failed += len(rows)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+            if stop:
+                connection.close()
+                return
+
+    def flush(self):
+        """انتظار كتابة كل السجلات الموجودة في الطابور"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self, timeout=5):
+        """كتابة المتبقي وإيقاف الكاتب عند إنهاء العملية"""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+    def recent(self, limit=100, risk_level=None, model_version=None, since=None, before_id=None):
+        """أحدث السجلات المكتوبة (الأحدث أولاً) مع ترقيم الصفحات بـ before_id"""
+        conditions, params = [], []
+        if risk_level is not None:
+            conditions.append('risk_level = ?')
+            params.append(risk_level)
+        if model_version is not None:
+            conditions.append('model_version = ?')
+            params.append(model_version)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if before_id is not None:
+            conditions.append('id < ?')
+            params.append(before_id)
+
+        # لم يُكتب أي تنبؤ بعد ولم تُنشأ القاعدة (مثلاً حُذفت بعد بدء الخادم)
+        if not os.path.exists(self.path):
+            return []
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM predictions"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+
+        connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, timeout=5)
+        try:
+            rows = connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+        records = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            record['inputs'] = json.loads(record['inputs'])
+            records.append(record)
+        return records
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'queued': self.queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches
+            }
@@ -0,0 +1,356 @@
+"""قياس أداء مسار التنبؤ في الخادم
+
+الاستخدام:
+    cd backend && python benchmark.py predict --requests 2000
+    cd backend && python benchmark.py startup --runs 3
+    cd backend && python benchmark.py what-if --steps 21
+    cd backend && python benchmark.py explainers --rows 20
+    cd backend && python benchmark.py profiler --requests 1000
+    cd backend && python benchmark.py compact --requests 2000
+    cd backend && python benchmark.py audit --records 50000
+    cd backend && WEB_CONCURRENCY=4 python benchmark.py threads --rows 20000
+    cd backend && python benchmark.py rescore --requests 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import app as server
+
+SAMPLE_PATIENT = {
+    'age': 58, 'sex': 1, 'cp': 2, 'trestbps': 150, 'chol': 270, 'fbs': 0, 'restecg': 1,
+    'thalach': 130, 'exang': 1, 'oldpeak': 2.3, 'slope': 1, 'ca': 1, 'thal': 2
+}
+
+def measure(func, repeats):
+    """متوسط زمن المعالج (CPU) والزمن الفعلي لكل استدعاء بالميكروثانية"""
+    func()  # إحماء
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    cpu = (time.process_time() - cpu_start) / repeats * 1e6
+    wall = (time.perf_counter() - wall_start) / repeats * 1e6
+    return cpu, wall
+
+def report(name, cpu, wall):
+    print(f"{name:<36} CPU: {cpu:12.1f} µs   Wall: {wall:12.1f} µs")
+
+def bench_predict(args):
+    """زمن كل طلب /api/predict كاملاً عبر عميل الاختبار"""
+    server.train_model()
+    client = server.app.test_client()
+
+    report('/api/predict', *measure(
+        lambda: client.post('/api/predict', json=SAMPLE_PATIENT), args.requests
+    ))
+    report('parse_input', *measure(
+        lambda: server.parse_input(SAMPLE_PATIENT), args.requests * 10
+    ))
+    report('get_feature_description', *measure(
+        lambda: server.get_feature_description('chol', 270, True), args.requests * 10
+    ))
+
+    model_input = np.array([SAMPLE_PATIENT[feature] for feature in server.feature_names], dtype=float)
+    report('explain_prediction', *measure(
+        lambda: server.explain_prediction(model_input), args.requests
+    ))
+
+    result = {
+        'probability': 0.53,
+        'prediction': 1,
+        'risk_level': server.get_risk_level(0.53),
+        'factors': server.explain_prediction(model_input),
+        'timestamp': '2024-01-01T00:00:00'
+    }
+    with server.app.app_context():
+        report('json_response', *measure(lambda: server.json_response(result), args.requests * 10))
+
+def bench_what_if(args):
+    """شبكة ماذا لو بطلب واحد مقابل طلب /api/predict لكل سيناريو"""
+    server.train_model()
+    client = server.app.test_client()
+    payload = {
+        'patient': SAMPLE_PATIENT,
+        'vary': {'chol': {'min': 150, 'max': 400, 'steps': args.steps},
+                 'trestbps': {'min': 100, 'max': 200, 'steps': args.steps}}
+    }
+    n_points = client.post('/api/what_if', json=payload).get_json()['n_points']
+
+    report(f'/api/what_if ({n_points} points)', *measure(
+        lambda: client.post('/api/what_if', json=payload), 20
+    ))
+
+    variants = [
+        dict(SAMPLE_PATIENT, chol=chol, trestbps=trestbps)
+        for chol in np.linspace(150, 400, args.steps).round()
+        for trestbps in np.linspace(100, 200, args.steps).round()
+    ]
+    report(f'/api/predict x {len(variants)}', *measure(
+        lambda: [client.post('/api/predict', json=variant) for variant in variants], 1
+    ))
+
+def bench_explainers(args):
+    """زمن تفسير صف واحد لكل عائلة: المفسر العام في shap مقابل المفسر الخاص بالعائلة"""
+    import shap
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+    from xgboost import XGBClassifier
+
+    from explainers import select_explainer
+    from training import create_synthetic_data
+
+    df = create_synthetic_data()
+    X = StandardScaler().fit_transform(df[server.feature_names])
+    y = df['target'].to_numpy()
+    background, rows = X[:100], X[-args.rows:]
+
+    candidates = {
+        'LogisticRegression': LogisticRegression(max_iter=1000),
+        'SVM': SVC(kernel='rbf', probability=True, random_state=42),
+        'RandomForest': RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42),
+        'XGBoost': XGBClassifier(n_estimators=100, max_depth=6, eval_metric='logloss')
+    }
+
+    for name, model in candidates.items():
+        model.fit(X, y)
+        generic = shap.Explainer(model.predict_proba, background)
+        specific = select_explainer(model, background)
+
+        # الزمن لكل صف
+        cpu, wall = measure(lambda: [generic(row.reshape(1, -1)) for row in rows], 1)
+        report(f'{name} shap.Explainer', cpu / len(rows), wall / len(rows))
+        cpu, wall = measure(lambda: [specific.shap_values(row.reshape(1, -1)) for row in rows], 1)
+        report(f'{name} {specific.family}', cpu / len(rows), wall / len(rows))
+
+def bench_profiler(args):
+    """تكلفة محلل الأداء بالعينات على /api/predict"""
+    server.train_model()
+    client = server.app.test_client()
+    request = lambda: client.post('/api/predict', json=SAMPLE_PATIENT)
+
+    server.profiler.enabled = False
+    report('/api/predict (profiler off)', *measure(request, args.requests))
+    server.profiler.enabled = True
+    report(f'/api/predict (profiler {server.profiler.interval_ms:g} ms)', *measure(request, args.requests))
+
+def bench_compact(args):
+    """النموذج الكامل مقابل النسخة المضغوطة المُقلّمة: الزمن لكل صف والتطابق على النطاق الصحيح"""
+    server.train_model()
+    if server.compact_model is None:
+        print(f"لا توجد نسخة مضغوطة مطابقة في {server.COMPACT_MODEL_PATH}")
+        return
+    
+    from compact_trees import domain_sample
+    
+    compact = server.compact_model
+    X = server.scaler.transform(domain_sample(
+        server.feature_names, server.FEATURE_RANGES, server.INTEGER_FEATURES, n_samples=20000, seed=1
+    ))
+    full = server.model.predict_proba(X)[:, 1]
+    fast = compact.predict_positive(X)
+    print(f"{compact.n_trees} trees, {compact.n_nodes} nodes, "
+          f"max |diff| over {len(X)} valid inputs: {np.abs(full - fast).max():.2e}, "
+          f"risk level mismatches: {(server.risk_level_indices(full) != server.risk_level_indices(fast)).sum()}")
+    
+    row = X[:1]
+    report('model.predict_proba (1 row)', *measure(lambda: server.model.predict_proba(row), args.requests))
+    report('compact.predict_positive (1 row)', *measure(lambda: compact.predict_positive(row), args.requests))
+    report('model.predict_proba (1000 rows)', *measure(lambda: server.model.predict_proba(X[:1000]), 20))
+    report('compact.predict_positive (1000 rows)', *measure(lambda: compact.predict_positive(X[:1000]), 20))
+
+def bench_audit(args):
+    """معدل كتابة سجل التدقيق (سجلات في الثانية) وتكلفته على /api/predict"""
+    from audit import AuditLog
+    
+    with tempfile.TemporaryDirectory() as directory:
+        audit_log = AuditLog(os.path.join(directory, 'audit.db'), max_queue=args.records)
+        audit_log.start()
+        
+        started = time.perf_counter()
+        for i in range(args.records):
+            audit_log.record(SAMPLE_PATIENT, 0.53, 1, 'متوسط', 'benchmark', 1.5)
+        enqueued = time.perf_counter() - started
+        audit_log.flush()
+        written = time.perf_counter() - started
+        
+        stats = audit_log.stats()
+        print(f"enqueue: {args.records / enqueued:,.0f} records/s, "
+              f"written: {stats['written'] / written:,.0f} records/s "
+              f"({stats['batches']} transactions, {stats['dropped']} dropped)")
+        report('audit recent(100)', *measure(lambda: audit_log.recent(100), 100))
+        report("audit recent(100, risk_level)", *measure(lambda: audit_log.recent(100, risk_level='متوسط'), 100))
+        audit_log.close()
+        
+        # سجل مؤقت بدلاً من قاعدة الخادم حتى لا تختلط السجلات الاصطناعية بسجل التدقيق الحقيقي
+        server.audit_log = AuditLog(os.path.join(directory, 'server.db'))
+        server.train_model()
+        client = server.app.test_client()
+        request = lambda: client.post('/api/predict', json=SAMPLE_PATIENT)
+        
+        server.audit_log.enabled = False
+        report('/api/predict (audit off)', *measure(request, args.requests))
+        server.audit_log.enabled = True
+        report('/api/predict (audit on)', *measure(request, args.requests))
+        server.audit_log.close()
+
+def bench_threads(args):
+    """ميزانية الخيوط لهذا العامل وزمن الدفعات الكبيرة بخيط واحد مقابل حصة العامل"""
+    server.train_model()
+    budget = server.THREAD_BUDGET
+    print(f"cpus {budget['cpus']} (affinity {budget['affinity']}, cgroup quota {budget['cgroup_quota']}), "
+          f"workers {budget['workers']}, threads per worker {budget['threads_per_worker']}")
+    for pool in budget.get('native_pools') or []:
+        print(f"  {pool['api']}: {pool['num_threads']} threads")
+    
+    X = np.repeat(server.scaler.transform([[SAMPLE_PATIENT[f] for f in server.feature_names]]), args.rows, axis=0)
+    threads = server.batch_executor.threads
+    server.batch_executor.threads = 1
+    report(f'predict_positive ({args.rows} rows, 1 thread)', *measure(lambda: server.predict_positive(X), 5))
+    server.batch_executor.threads = threads
+    report(f'predict_positive ({args.rows} rows, {threads} threads)', *measure(lambda: server.predict_positive(X), 5))
+
+# تعديلات متابعة نموذجية (ميزة واحدة في كل مرة)
+RESCORE_CHANGES = [
+    {'chol': 280}, {'chol': 300}, {'trestbps': 155}, {'age': 59},
+    {'thalach': 140}, {'exang': 0}, {'cp': 0}, {'oldpeak': 2.0}
+]
+
+def bench_rescore(args):
+    """إعادة التقييم التدريجي مقابل التقييم الكامل لتعديل ميزة واحدة"""
+    server.train_model()
+    if server.rescoring is None:
+        print(f"إعادة التقييم التدريجي غير متوفرة (لا توجد نسخة مضغوطة في {server.COMPACT_MODEL_PATH})")
+        return
+    
+    rescoring = server.rescoring
+    client = server.app.test_client()
+    base = np.array([SAMPLE_PATIENT[f] for f in server.feature_names], dtype=float)
+    handle, _ = rescoring.create(base, server.scaler.transform(base[np.newaxis])[0])
+    print(f"{type(server.model).__name__}: {rescoring.compact.n_trees} trees, handle {len(handle)} chars")
+    
+    for changes in RESCORE_CHANGES:
+        row = base.copy()
+        for feature, value in changes.items():
+            row[server.FEATURE_INDEX[feature]] = value
+        row_scaled = server.scaler.transform(row[np.newaxis])
+        state, _ = rescoring.decode(handle)
+        outcome = rescoring.rescore(state, row, row_scaled[0])
+        name = ', '.join(f'{feature}={value}' for feature, value in changes.items())
+        print(f"{name}: {outcome['trees_rescored']} trees rescored")
+        
+        report('  full: model.predict_proba', *measure(lambda: server.model.predict_proba(row_scaled), args.requests))
+        report('  full: compact', *measure(lambda: rescoring.compact.predict_positive(row_scaled), args.requests))
+        report('  incremental (decode + rescore)', *measure(
+            lambda: rescoring.rescore(rescoring.decode(handle)[0], row, row_scaled[0]), args.requests
+        ))
+    
+    server.profiler.enabled = False
+    patient = dict(SAMPLE_PATIENT, chol=280)
+    full = measure(lambda: client.post('/api/predict', json=patient), args.requests)
+    report('/api/predict', *full)
+    report('/api/predict (rescorable)', *measure(
+        lambda: client.post('/api/predict', json=dict(patient, rescorable=True)), args.requests
+    ))
+    handle = client.post('/api/predict', json=dict(SAMPLE_PATIENT, rescorable=True)).get_json()['handle']
+    request = {'handle': handle, 'changes': {'chol': 280}}
+    incremental = measure(lambda: client.post('/api/rescore', json=request), args.requests)
+    report('/api/rescore', *incremental)
+    report('/api/rescore (explain)', *measure(
+        lambda: client.post('/api/rescore', json=dict(request, explain=True)), args.requests
+    ))
+    print(f"end-to-end: /api/predict {full[1]:.0f} µs -> /api/rescore {incremental[1]:.0f} µs "
+          f"({full[1] / incremental[1]:.1f}x)")
+
+# يُنفذ في عملية جديدة لقياس تكلفة تشغيل عامل gunicorn من الصفر
+STARTUP_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.train_model()
+loaded = time.perf_counter()
+app.app.test_client().post('/api/predict', json=json.loads(sys.argv[1]))
+predicted = time.perf_counter()
+heavy = ['shap', 'pandas', 'sklearn.model_selection', 'matplotlib', 'numba']
+print(json.dumps({
+    'import_seconds': imported - started,
+    'load_seconds': loaded - imported,
+    'first_predict_seconds': predicted - loaded,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [name for name in heavy if name in sys.modules]
+}))
+"""
+
+def bench_startup(args):
+    """زمن الاستيراد وتحميل النموذج وذروة الذاكرة لعامل جديد"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    for run in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE, json.dumps(SAMPLE_PATIENT)], env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        print(f"run {run + 1}: import {stats['import_seconds']:.2f} s, "
+              f"model load + warm-up {stats['load_seconds']:.2f} s, "
+              f"first predict {stats['first_predict_seconds'] * 1000:.0f} ms, "
+              f"max RSS after first predict {stats['max_rss_mb']:.0f} MB, "
+              f"heavy modules: {', '.join(stats['heavy_modules']) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء الخادم')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    predict_parser = subparsers.add_parser('predict', help='زمن طلب التنبؤ')
+    predict_parser.add_argument('--requests', type=int, default=2000)
+    predict_parser.set_defaults(func=bench_predict)
+
+    startup_parser = subparsers.add_parser('startup', help='زمن التشغيل والذاكرة لكل عامل')
+    startup_parser.add_argument('--runs', type=int, default=3)
+    startup_parser.set_defaults(func=bench_startup)
+
+    what_if_parser = subparsers.add_parser('what-if', help='زمن شبكة ماذا لو')
+    what_if_parser.add_argument('--steps', type=int, default=21)
+    what_if_parser.set_defaults(func=bench_what_if)
+
+    explainers_parser = subparsers.add_parser('explainers', help='زمن تفسير صف واحد لكل عائلة نماذج')
+    explainers_parser.add_argument('--rows', type=int, default=20)
+    explainers_parser.set_defaults(func=bench_explainers)
+
+    profiler_parser = subparsers.add_parser('profiler', help='تكلفة محلل الأداء بالعينات')
+    profiler_parser.add_argument('--requests', type=int, default=1000)
+    profiler_parser.set_defaults(func=bench_profiler)
+
+    compact_parser = subparsers.add_parser('compact', help='النموذج الكامل مقابل النسخة المضغوطة')
+    compact_parser.add_argument('--requests', type=int, default=2000)
+    compact_parser.set_defaults(func=bench_compact)
+
+    audit_parser = subparsers.add_parser('audit', help='معدل كتابة سجل التدقيق وتكلفته')
+    audit_parser.add_argument('--records', type=int, default=50000)
+    audit_parser.add_argument('--requests', type=int, default=1000)
+    audit_parser.set_defaults(func=bench_audit)
+
+    threads_parser = subparsers.add_parser('threads', help='ميزانية الخيوط وزمن الدفعات الكبيرة')
+    threads_parser.add_argument('--rows', type=int, default=20000)
+    threads_parser.set_defaults(func=bench_threads)
+
+    rescore_parser = subparsers.add_parser('rescore', help='إعادة التقييم التدريجي مقابل التقييم الكامل')
+    rescore_parser.add_argument('--requests', type=int, default=200)
+    rescore_parser.set_defaults(func=bench_rescore)
+
+    args = parser.parse_args()
+
+    # إيقاف سجلات كل طلب حتى لا تطغى على القياس
+    server.logger.setLevel('WARNING')
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
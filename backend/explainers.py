@@ -0,0 +1,92 @@
+"""مفسرات سريعة خاصة بكل عائلة نماذج
+
+كل مفسر يستقبل صفوفاً مطبّعة (كما تدرّب النموذج) ويعيد مصفوفة تأثيرات
+(n_samples, n_features) للفئة الإيجابية. shap يُستورد فقط عند أول تفسير
+لأنه ثقيل جداً عند الاستيراد.
+"""
+import logging
+
+import numpy as np
+
+def positive_class_values(values):
+    """توحيد مخرجات shap (قائمة أو مصفوفة ثلاثية الأبعاد) إلى تأثيرات الفئة الإيجابية"""
+    if isinstance(values, list):
+        values = values[1]
+    values = np.asarray(values)
+    if values.ndim == 3:
+        values = values[:, :, 1]
+    return values
+
+class LinearExplainer:
+    """تأثيرات SHAP الدقيقة لنموذج خطي (في فضاء logit) مباشرة من المعاملات
+
+    مع ميزات مستقلة: تأثير الميزة = معاملها × (قيمتها - متوسط الخلفية).
+    بعد التطبيع يكون متوسط بيانات التدريب صفراً (متوسط المعايرة).
+    """
+    family = 'linear'
+
+    def __init__(self, model, background=None):
+        self.coef = np.ravel(model.coef_)
+        if background is None:
+            self.mean = np.zeros_like(self.coef)
+        else:
+            self.mean = np.asarray(background, dtype=float).mean(axis=0)
+
+    def shap_values(self, X):
+        return (np.atleast_2d(X) - self.mean) * self.coef
+
+class TreeExplainer:
+    """TreeSHAP الدقيق لنماذج الأشجار (RandomForest و XGBoost و GradientBoosting)"""
+    family = 'tree'
+
+    def __init__(self, model):
+        self.model = model
+        self.explainer = None
+
+    def shap_values(self, X):
+        if self.explainer is None:
+            import shap
+            self.explainer = shap.TreeExplainer(self.model)
+        return positive_class_values(self.explainer.shap_values(np.atleast_2d(X)))
+
+class KernelExplainer:
+    """KernelSHAP بخلفية ملخصة بـ k-means وعدد تقييمات محدود (لنماذج SVM وغيرها)"""
+    family = 'kernel'
+
+    def __init__(self, model, background, n_clusters=10, nsamples=200):
+        self.model = model
+        self.background = np.asarray(background, dtype=float)
+        self.n_clusters = min(n_clusters, len(self.background))
+        self.nsamples = nsamples
+        self.explainer = None
+
+    def predict_positive(self, X):
+        return self.model.predict_proba(X)[:, 1]
+
+    def shap_values(self, X):
+        if self.explainer is None:
+            import shap
+            # KernelExplainer يسجل رسائل INFO مع كل تفسير
+            logging.getLogger('shap').setLevel(logging.WARNING)
+            summary = shap.kmeans(self.background, self.n_clusters)
+            self.explainer = shap.KernelExplainer(self.predict_positive, summary)
+        values = self.explainer.shap_values(np.atleast_2d(X), nsamples=self.nsamples, silent=True)
+        return positive_class_values(values)
+
+def model_family(model):
+    """عائلة النموذج: linear أو tree أو kernel"""
+    if hasattr(model, 'estimators_') or hasattr(model, 'get_booster') or hasattr(model, 'tree_'):
+        return 'tree'
+    # SVC بنواة غير خطية يرفع AttributeError عند الوصول إلى coef_ و getattr يعيد None
+    if getattr(model, 'coef_', None) is not None:
+        return 'linear'
+    return 'kernel'
+
+def select_explainer(model, background, n_clusters=10, nsamples=200):
+    """اختيار المفسر المناسب تلقائياً حسب عائلة النموذج"""
+    family = model_family(model)
+    if family == 'linear':
+        return LinearExplainer(model, background)
+    if family == 'tree':
+        return TreeExplainer(model)
+    return KernelExplainer(model, background, n_clusters=n_clusters, nsamples=nsamples)
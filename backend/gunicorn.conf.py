@@ -0,0 +1,6 @@
+"""إعدادات gunicorn: كل عامل يحمّل النموذج ويجهّز المفسر (استيراد shap) بعد fork
+وقبل استقبال أول طلب، بدلاً من أن يدفع أول طلب هذه التكلفة"""
+
+def post_worker_init(worker):
+    import app
+    app.initialize()
@@ -0,0 +1,222 @@
+"""محلل أداء بالعينات (sampling profiler) لطلبات الخادم
+
+thread واحد يأخذ عينة من مكدس كل thread يعالج طلباً كل interval_ms:
+- العينات تُجمع دائماً في ملف تعريف تراكمي منخفض التكلفة (always-on)
+- عينات كل طلب تُحفظ على القرص فقط إذا تجاوز زمنه slow_threshold_ms
+  في مخزن دائري (ring buffer) محدود بعدد الملفات
+
+زمن جمع القمامة (GC) يظهر كإطار "[gc]" أعلى مكدس الـ thread الذي شغّله.
+"""
+import gc
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_STACK_DEPTH = 128
+GC_FRAME = '[gc]'
+
+logger = logging.getLogger(__name__)
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def to_collapsed(samples):
+    """تصدير بصيغة collapsed stacks (سطر لكل مكدس: الإطارات مفصولة بـ ; ثم العدد)"""
+    return '\n'.join(f'{stack} {count}' for stack, count in sorted(samples.items())) + '\n'
+
+def to_speedscope(samples, name, interval_ms):
+    """تصدير بصيغة speedscope (ملف تعريف sampled بأوزان بالميلي ثانية)"""
+    frames, frame_index = [], {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        indices = []
+        for frame in stack.split(';'):
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({'name': frame})
+            indices.append(frame_index[frame])
+        stacks.append(indices)
+        weights.append(count * interval_ms)
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'heart-disease-backend',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': stacks,
+            'weights': weights
+        }]
+    }
+
+class SamplingProfiler:
+    """محلل أداء بالعينات مع حفظ تلقائي لملفات تعريف الطلبات البطيئة"""
+
+    def __init__(self, interval_ms=10, slow_threshold_ms=500, profile_dir='logs/profiles',
+                 max_profiles=50, max_stacks=5000, enabled=True):
+        self.interval_ms = interval_ms
+        self.slow_threshold_ms = slow_threshold_ms
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self.max_stacks = max_stacks
+        self.enabled = enabled
+
+        self.lock = threading.Lock()
+        self.active = {}
+        self.aggregate = Counter()
+        self.gc_threads = set()
+        self.counter = itertools.count()
+        self.pid = None
+
+    def start(self):
+        """تشغيل thread أخذ العينات مرة واحدة لكل عملية (بعد fork في gunicorn)"""
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        gc.callbacks.append(self.on_gc)
+        threading.Thread(target=self.run, name='sampling-profiler', daemon=True).start()
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.gc_threads.add(threading.get_ident())
+        else:
+            self.gc_threads.discard(threading.get_ident())
+
+    def begin_request(self, description):
+        if not self.enabled:
+            return
+        self.start()
+        with self.lock:
+            self.active[threading.get_ident()] = {
+                'description': description,
+                'started': time.perf_counter(),
+                'samples': Counter()
+            }
+
+    def end_request(self):
+        """إنهاء الطلب الحالي وحفظ ملف تعريفه إذا كان بطيئاً"""
+        with self.lock:
+            record = self.active.pop(threading.get_ident(), None)
+        if record is None:
+            return None
+
+        duration_ms = (time.perf_counter() - record['started']) * 1000
+        if duration_ms >= self.slow_threshold_ms and record['samples']:
+            try:
+                self.save_profile(record, duration_ms)
+            except OSError as e:
+                # يُستدعى من teardown_request، فلا يجب أن يفشل الطلب بسبب مجلد غير قابل للكتابة
+                logger.warning(f"تعذر حفظ ملف تعريف الطلب في {self.profile_dir}: {e}")
+        return duration_ms
+
+    def run(self):
+        interval = self.interval_ms / 1000
+        while True:
+            time.sleep(interval)
+            if self.active:
+                try:
+                    self.sample()
+                except Exception:
+                    # خطأ في عينة واحدة لا يجب أن يوقف thread أخذ العينات
+                    logger.exception("فشل في أخذ عينة من المكدس")
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            thread_ids = list(self.active)
+
+        stacks = []
+        for thread_id in thread_ids:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            # تخطي أي كائن ليس إطاراً حقيقياً (بلا f_code)
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = getattr(frame, 'f_code', None)
+                if code is not None:
+                    stack.append(frame_name(code))
+                frame = getattr(frame, 'f_back', None)
+            stack.reverse()
+            if thread_id in self.gc_threads:
+                stack.append(GC_FRAME)
+            stacks.append((thread_id, ';'.join(stack)))
+
+        with self.lock:
+            for thread_id, stack in stacks:
+                record = self.active.get(thread_id)
+                if record is None:
+                    continue  # انتهى الطلب أثناء أخذ العينة
+                record['samples'][stack] += 1
+                if stack in self.aggregate or len(self.aggregate) < self.max_stacks:
+                    self.aggregate[stack] += 1
+
+    def save_profile(self, record, duration_ms):
+        """كتابة ملف التعريف ثم حذف الأقدم بحيث لا يتجاوز العدد max_profiles"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile_id = f"{int(time.time() * 1000)}-{os.getpid()}-{next(self.counter)}"
+        path = os.path.join(self.profile_dir, f'{profile_id}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'id': profile_id,
+                'description': record['description'],
+                'duration_ms': duration_ms,
+                'interval_ms': self.interval_ms,
+                'samples': dict(record['samples'])
+            }, f)
+        os.replace(path + '.tmp', path)
+
+        profiles = self.profile_files()
+        for name in profiles[:-self.max_profiles]:
+            try:
+                os.remove(os.path.join(self.profile_dir, name))
+            except FileNotFoundError:
+                pass  # حذفه عامل آخر
+
+    def profile_files(self):
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted(name for name in os.listdir(self.profile_dir) if name.endswith('.json'))
+
+    def list_profiles(self):
+        profiles = []
+        for name in reversed(self.profile_files()):
+            profile = self.load_profile(name[:-len('.json')])
+            if profile is not None:
+                profiles.append({
+                    'id': profile['id'],
+                    'description': profile['description'],
+                    'duration_ms': round(profile['duration_ms'], 1),
+                    'n_samples': sum(profile['samples'].values())
+                })
+        return profiles
+
+    def load_profile(self, profile_id):
+        try:
+            with open(os.path.join(self.profile_dir, f'{profile_id}.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def live_profile(self):
+        """الملف التراكمي لهذا العامل منذ بدء التشغيل"""
+        with self.lock:
+            samples = dict(self.aggregate)
+        return {
+            'id': 'live',
+            'description': f'worker {os.getpid()}',
+            'duration_ms': sum(samples.values()) * self.interval_ms,
+            'interval_ms': self.interval_ms,
+            'samples': samples
+        }
@@ -0,0 +1,112 @@
+"""إعادة التقييم التدريجي لمريض بعد تغيير بعض ميزاته
+
+حالة التنبؤ (القيم الخام والورقة التي وصل إليها في كل شجرة) تُرسل للعميل في
+رمز موقّع بـ HMAC بدلاً من حفظها في ذاكرة العامل، فأي عامل يستطيع إعادة التقييم.
+عند تغيير ميزات قليلة تُعاد فقط الأشجار التي خرج الصف الجديد من منطقة ورقتها السابقة
+(حدود الورقة على الميزات المتغيرة)، والنتيجة مطابقة تماماً للتقييم الكامل بالنسخة المضغوطة.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+
+import numpy as np
+
+SIGNATURE_BYTES = 16
+VERSION_BYTES = 16
+
+def shared_secret(path):
+    """مفتاح توقيع مشترك بين عمال نفس الخادم: ينشئه أول عامل في ملف ويقرؤه الباقون"""
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) >= 32:
+            return key
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secrets.token_bytes(32))
+    try:
+        # link يفشل إذا سبقه عامل آخر، فيستخدم الجميع نفس المفتاح
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp_path)
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+class Rescorer:
+    """إنشاء رموز حالة التنبؤ وإعادة تقييم الأشجار التي تغيرت ورقتها فقط"""
+
+    def __init__(self, compact, secret, n_features):
+        self.compact = compact
+        self.secret = secret
+        self.n_features = n_features
+        self.version = compact.model_version.encode('ascii')[:VERSION_BYTES].ljust(VERSION_BYTES, b'\0')
+        self.low, self.high = compact.leaf_bounds(n_features)
+        self.payload_size = VERSION_BYTES + 8 * n_features + 4 * compact.n_trees
+
+    def sign(self, payload):
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+    def encode(self, row, leaves):
+        payload = b''.join([
+            self.version,
+            np.asarray(row, dtype='<f8').tobytes(),
+            np.asarray(leaves, dtype='<i4').tobytes()
+        ])
+        return base64.urlsafe_b64encode(payload + self.sign(payload)).rstrip(b'=').decode('ascii')
+
+    def decode(self, token):
+        """(الحالة، رسالة الخطأ): الرمز يجب أن يكون موقّعاً من هذا الخادم ولنفس إصدار النموذج"""
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except (ValueError, TypeError):
+            return None, 'invalid'
+        payload, signature = raw[:-SIGNATURE_BYTES], raw[-SIGNATURE_BYTES:]
+        if len(payload) != self.payload_size or not hmac.compare_digest(signature, self.sign(payload)):
+            return None, 'invalid'
+        if payload[:VERSION_BYTES] != self.version:
+            return None, 'stale'
+
+        offset = VERSION_BYTES
+        row = np.frombuffer(payload, dtype='<f8', count=self.n_features, offset=offset).astype(float)
+        offset += 8 * self.n_features
+        leaves = np.frombuffer(payload, dtype='<i4', count=self.compact.n_trees, offset=offset).astype(np.intp)
+        return {'row': row, 'leaves': leaves}, None
+
+    def probability(self, leaves):
+        return float(self.compact.combine(self.compact.value[leaves].sum()))
+
+    def create(self, row, row_scaled):
+        """تقييم كامل بالنسخة المضغوطة، ويعيد (الرمز، الاحتمالية)"""
+        leaves = np.array(self.compact.row_leaves(row_scaled, range(self.compact.n_trees)))
+        return self.encode(row, leaves), self.probability(leaves)
+
+    def rescore(self, state, row, row_scaled):
+        """إعادة تقييم حالة سابقة بقيم جديدة (الأشجار التي خرج الصف من منطقة ورقتها فقط)"""
+        row = np.asarray(row, dtype=float)
+        row_scaled = np.asarray(row_scaled, dtype=float)
+        changed = np.flatnonzero(row != state['row'])
+
+        leaves = state['leaves'].copy()
+        x = row_scaled[changed].astype(np.float32)
+        region = np.ix_(leaves, changed)
+        inside = (self.low[region] < x) & (x <= self.high[region])
+        trees = np.flatnonzero(~inside.all(axis=1))
+        if trees.size:
+            leaves[trees] = self.compact.row_leaves(row_scaled, trees)
+
+        return {
+            'handle': self.encode(row, leaves),
+            'probability': self.probability(leaves),
+            'changed_features': changed,
+            'trees_rescored': len(trees)
+        }
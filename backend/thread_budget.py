@@ -0,0 +1,113 @@
+"""ميزانية خيوط المعالج (threads) لكل عامل gunicorn
+
+عدد الأنوية المتاحة فعلياً (مع حدود cgroup في الحاويات و CPU affinity) يُقسم على
+عدد العمال. خيوط BLAS و OpenMP (ومنها XGBoost) تُثبَّت على خيط واحد قبل استيراد numpy،
+فالطلب الفردي يعمل بخيط واحد، وحصة العامل تُستخدم فقط لتقسيم الدفعات الكبيرة على
+مجمّع خيوط بحجمها (بدلاً من أن تفتح كل مكتبة خيطاً لكل نواة في كل عامل).
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# متغيرات البيئة التي تقرأها مكتبات BLAS و OpenMP عند تحميلها
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS'
+)
+
+def cgroup_cpu_limit():
+    """حد المعالج من cgroup (v2 ثم v1) كعدد أنوية، أو None إذا لم يوجد حد"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def detect_cpus():
+    """الأنوية المتاحة للعملية: الأقل بين CPU affinity وحد cgroup"""
+    try:
+        affinity = len(os.sched_getaffinity(0))
+    except AttributeError:
+        affinity = os.cpu_count() or 1
+
+    quota = cgroup_cpu_limit()
+    cpus = affinity if quota is None else max(1, min(affinity, math.ceil(quota)))
+    return {'cpus': cpus, 'affinity': affinity, 'cgroup_quota': quota}
+
+def compute_budget(workers=None, threads=None, parallel_min_rows=1000):
+    """حصة كل عامل من الأنوية (WEB_CONCURRENCY هو عدد عمال gunicorn)"""
+    budget = detect_cpus()
+    if workers is None:
+        workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    workers = max(1, workers)
+    if threads is None:
+        threads = max(1, budget['cpus'] // workers)
+
+    budget.update({
+        'workers': workers,
+        'threads_per_worker': threads,
+        'parallel_min_rows': parallel_min_rows
+    })
+    return budget
+
+def pin_native_threads(threads):
+    """تثبيت عدد خيوط BLAS/OpenMP قبل استيراد numpy (القيم المحددة صراحة في البيئة تُحترم)"""
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+    return {name: os.environ[name] for name in THREAD_ENV_VARS}
+
+def limit_loaded_pools(threads):
+    """تطبيق الحد على المكتبات المحمّلة فعلاً (يتطلب threadpoolctl، اختياري)"""
+    try:
+        from threadpoolctl import threadpool_info, threadpool_limits
+    except ImportError:
+        return None
+
+    threadpool_limits(limits=threads)
+    return [
+        {'api': pool['internal_api'], 'num_threads': pool['num_threads']}
+        for pool in threadpool_info()
+    ]
+
+def pin_model_threads(model):
+    """النموذج يعمل بخيط واحد لكل استدعاء، والتوازي يأتي من تقسيم الدفعات الكبيرة"""
+    params = getattr(model, 'get_params', dict)()
+    if 'n_jobs' in params:
+        model.set_params(n_jobs=1)
+    if 'nthread' in params:
+        model.set_params(nthread=1)
+
+class ChunkedExecutor:
+    """تقسيم دفعة كبيرة على مجمّع خيوط بحجم حصة العامل (يُنشأ بعد fork)"""
+
+    def __init__(self, threads):
+        self.threads = threads
+        self.pool = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def map_rows(self, func, X):
+        # طلبان كبيران متزامنان في عامل متعدد الخيوط يجب ألا ينشئا مجمّعين
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='batch')
+                self.pid = os.getpid()
+            pool = self.pool
+
+        chunk = math.ceil(len(X) / self.threads)
+        return list(pool.map(func, [X[i:i + chunk] for i in range(0, len(X), chunk)]))
@@ -0,0 +1,129 @@
+"""تدريب نموذج احتياطي داخل الخادم عند عدم توفر نموذج محفوظ
+
+يُستورد عند الحاجة فقط حتى لا تحمّل عمليات الخدمة pandas وأدوات التدريب.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
+
+logger = logging.getLogger(__name__)
+
+def create_synthetic_data():
+    """إنشاء بيانات تصنيعية للتدريب إذا لم تكن متوفرة"""
+    np.random.seed(42)
+    n_samples = 1000
+    
+    # إنشاء البيانات
+    data = {
+        'age': np.random.randint(29, 80, n_samples),
+        'sex': np.random.randint(0, 2, n_samples),
+        'cp': np.random.randint(0, 4, n_samples),
+        'trestbps': np.random.normal(130, 15, n_samples).clip(90, 200).astype(int),
+        'chol': np.random.normal(240, 50, n_samples).clip(150, 400).astype(int),
+        'fbs': np.random.randint(0, 2, n_samples),
+        'restecg': np.random.randint(0, 3, n_samples),
+        'thalach': np.random.normal(150, 20, n_samples).clip(100, 200).astype(int),
+        'exang': np.random.randint(0, 2, n_samples),
+        'oldpeak': np.random.exponential(1, n_samples).clip(0, 6),
+        'slope': np.random.randint(0, 3, n_samples),
+        'ca': np.random.randint(0, 5, n_samples),
+        'thal': np.random.randint(1, 4, n_samples)
+    }
+    
+    df = pd.DataFrame(data)
+    
+    # إنشاء المتغير التابع بناءً على القواعد الطبية
+    target = np.zeros(n_samples)
+    for i in range(n_samples):
+        risk_score = 0
+        
+        # العمر
+        if df.loc[i, 'age'] > 65: risk_score += 3
+        elif df.loc[i, 'age'] > 55: risk_score += 2
+        elif df.loc[i, 'age'] > 45: risk_score += 1
+        
+        # الجنس (الرجال أكثر عرضة)
+        if df.loc[i, 'sex'] == 1: risk_score += 1
+        
+        # نوع ألم الصدر
+        if df.loc[i, 'cp'] == 1: risk_score += 3  # ألم ذبحة نموذجي
+        elif df.loc[i, 'cp'] == 2: risk_score += 2  # ألم ذبحة غير نموذجي
+        elif df.loc[i, 'cp'] == 0: risk_score += 1  # لا ألم
+        
+        # ضغط الدم
+        if df.loc[i, 'trestbps'] > 160: risk_score += 3
+        elif df.loc[i, 'trestbps'] > 140: risk_score += 2
+        elif df.loc[i, 'trestbps'] > 120: risk_score += 1
+        
+        # الكولسترول
+        if df.loc[i, 'chol'] > 280: risk_score += 2
+        elif df.loc[i, 'chol'] > 240: risk_score += 1
+        
+        # سكر الدم
+        if df.loc[i, 'fbs'] == 1: risk_score += 1
+        
+        # معدل ضربات القلب القصوى
+        if df.loc[i, 'thalach'] < 120: risk_score += 2
+        elif df.loc[i, 'thalach'] < 140: risk_score += 1
+        
+        # العوامل الأخرى
+        if df.loc[i, 'exang'] == 1: risk_score += 2
+        if df.loc[i, 'oldpeak'] > 3: risk_score += 2
+        elif df.loc[i, 'oldpeak'] > 1: risk_score += 1
+        
+        risk_score += df.loc[i, 'ca']  # عدد الأوعية
+        
+        if df.loc[i, 'thal'] == 2: risk_score += 2
+        
+        # إضافة عشوائية للواقعية
+        final_score = risk_score + np.random.normal(0, 1.5)
+        target[i] = 1 if final_score > 6 else 0
+    
+    df['target'] = target.astype(int)
+    logger.info(f"تم إنشاء {len(df)} عينة")
+    logger.info(f"توزيع الفئات: {df['target'].value_counts().to_dict()}")
+    
+    return df
+
+def train_fallback_model(feature_names):
+    """تدريب نموذج RandomForest على البيانات التصنيعية وإرجاع النموذج والمعايرة"""
+    # إنشاء البيانات
+    df = create_synthetic_data()
+    
+    # تحضير البيانات
+    X = df[feature_names]
+    y = df['target']
+    
+    # تقسيم البيانات
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    
+    # تطبيع البيانات
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    
+    # تدريب النموذج
+    model = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42
+    )
+    
+    model.fit(X_train_scaled, y_train)
+    
+    # تقييم النموذج
+    train_score = model.score(X_train_scaled, y_train)
+    test_score = model.score(X_test_scaled, y_test)
+    
+    logger.info(f"دقة التدريب: {train_score:.3f}")
+    logger.info(f"دقة الاختبار: {test_score:.3f}")
+    
+    return model, scaler, X_train_scaled
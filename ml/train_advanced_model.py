@@ -3,10 +3,12 @@ import numpy as np
 from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier, Ridge
 from sklearn.svm import SVC
+from sklearn.tree._tree import Tree
+import xgboost as xgb
 from xgboost import XGBClassifier
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
+from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve, log_loss
 import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -14,13 +16,117 @@ import shap
 import warnings
 from datetime import datetime
 import os
+import json
+import copy
+import io
+import pickle
+import zlib
+import time
+import hashlib
+import inspect
+import shutil
+import argparse
 
 warnings.filterwarnings('ignore')
 
+class ChunkDataIterator(xgb.DataIter):
+    """مكرر دفعات لـ XGBoost بحيث يُبنى DMatrix من القرص (external memory)"""
+
+    def __init__(self, make_chunks, cache_prefix):
+        self.make_chunks = make_chunks
+        self.chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self.chunks is None:
+            self.chunks = self.make_chunks()
+        try:
+            X, y = next(self.chunks)
+        except StopIteration:
+            return False
+        input_data(data=X, label=y)
+        return True
+
+    def reset(self):
+        self.chunks = None
+
+class TrainingCache:
+    """ذاكرة مؤقتة للتدريب معنونة بالمحتوى (البيانات، المعالجة، ومعاملات كل نموذج)"""
+
+    def __init__(self, cache_dir='cache', max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def fingerprint(*parts):
+        """بصمة sha256 لمجموعة من المكونات (DataFrame أو نص أو أي قيمة قابلة للتمثيل)"""
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, pd.DataFrame):
+                digest.update(','.join(map(str, part.columns)).encode('utf-8'))
+                digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            else:
+                digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, f'{key}.pkl')
+
+    def get(self, kind, key):
+        """قراءة عنصر من الذاكرة المؤقتة (أو None)"""
+        path = self.path(kind, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            value = joblib.load(path)
+        except Exception as e:
+            print(f"تجاهل عنصر تالف في الذاكرة المؤقتة ({path}): {e}")
+            os.remove(path)
+            return None
+        
+        # تحديث وقت الاستخدام حتى يُحذف الأقدم استخداماً أولاً
+        os.utime(path)
+        return value
+
+    def put(self, kind, key, value):
+        """حفظ عنصر بكتابة ذرية ثم تطبيق حد الحجم"""
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(value, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.evict()
+
+    def evict(self):
+        """حذف العناصر الأقدم استخداماً حتى يصبح الحجم ضمن الحد"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """إبطال الذاكرة المؤقتة بالكامل"""
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        print(f"تم مسح الذاكرة المؤقتة: {self.cache_dir}")
+
 class HeartDiseasePredictor:
-    def __init__(self):
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.data_key = None
         self.models = {}
         self.best_model = None
+        self.surrogate = None
+        self.compact_model = None
         self.scaler = StandardScaler()
         self.feature_names = [
             'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs',
@@ -41,6 +147,13 @@ class HeartDiseasePredictor:
             'ca': 'عدد الأوعية الملونة',
             'thal': 'نوع الثلاسيميا'
         }
+        # نطاقات المدخلات الصحيحة (نفس حدود validate_input في الخادم)
+        self.feature_ranges = {
+            'age': (1, 120), 'sex': (0, 1), 'cp': (0, 3), 'trestbps': (80, 250),
+            'chol': (100, 600), 'fbs': (0, 1), 'restecg': (0, 2), 'thalach': (60, 220),
+            'exang': (0, 1), 'oldpeak': (0, 10), 'slope': (0, 2), 'ca': (0, 4), 'thal': (1, 3)
+        }
+        self.integer_features = set(self.feature_names) - {'oldpeak'}
 
     def create_enhanced_synthetic_data(self, n_samples=2000):
         """إنشاء بيانات تصنيعية محسنة ومتوازنة"""
@@ -178,6 +291,43 @@ class HeartDiseasePredictor:
         
         return df
 
+    def load_or_create_data(self, n_samples=2000):
+        """إنشاء البيانات أو قراءتها من الذاكرة المؤقتة إذا لم يتغير المولد"""
+        if self.cache is None:
+            return self.create_enhanced_synthetic_data(n_samples=n_samples)
+        
+        key = self.cache.fingerprint(inspect.getsource(self.create_enhanced_synthetic_data), n_samples)
+        df = self.cache.get('data', key)
+        if df is None:
+            df = self.create_enhanced_synthetic_data(n_samples=n_samples)
+            self.cache.put('data', key, df)
+        else:
+            print(f"تم تحميل {len(df)} عينة من الذاكرة المؤقتة")
+        return df
+
+    def prepare_data_cached(self, df):
+        """تحضير البيانات مع إعادة استخدام التقسيم والمعايرة إذا لم تتغير البيانات أو المعالجة"""
+        if self.cache is None:
+            return self.prepare_data(df)
+        
+        self.data_key = self.cache.fingerprint(df, inspect.getsource(self.prepare_data))
+        cached = self.cache.get('prepared', self.data_key)
+        if cached is not None:
+            print("تم تحميل البيانات المحضرة والمعايرة من الذاكرة المؤقتة")
+            self.scaler, prepared = cached
+            return prepared
+        
+        prepared = self.prepare_data(df)
+        self.cache.put('prepared', self.data_key, (self.scaler, prepared))
+        return prepared
+
+    def model_cache_key(self, name, model):
+        """بصمة النموذج: البيانات المحضرة + نوع النموذج ومعاملاته + كود التقييم"""
+        params = json.dumps(model.get_params(), sort_keys=True, default=str)
+        return self.cache.fingerprint(
+            self.data_key, name, type(model).__name__, params, inspect.getsource(self.evaluate_model)
+        )
+
     def prepare_data(self, df):
         """تحضير وتنظيف البيانات"""
         print("تحضير البيانات للتدريب...")
@@ -259,36 +409,22 @@ class HeartDiseasePredictor:
             print(f"تدريب نموذج: {name}")
             print('='*50)
             
-            # التدريب
-            model.fit(X_train, y_train)
-            
-            # التنبؤ
-            y_pred = model.predict(X_test)
-            y_pred_proba = model.predict_proba(X_test)[:, 1]
+            # إعادة استخدام النموذج المدرب ونتائجه إذا لم يتغير شيء
+            key = None
+            if self.cache is not None and self.data_key is not None:
+                key = self.model_cache_key(name, model)
+                cached = self.cache.get('models', key)
+                if cached is not None:
+                    print("تم تحميل النموذج ونتائجه من الذاكرة المؤقتة")
+                    print(f"AUC Score: {cached['auc']:.4f}")
+                    print(f"CV AUC Score: {cached['cv_auc']:.4f} (+/- {cached['cv_std'] * 2:.4f})")
+                    self.models[name] = cached['model']
+                    model_results[name] = cached
+                    continue
             
-            # التقييم
-            auc = roc_auc_score(y_test, y_pred_proba)
-            
-            # Cross-validation
-            cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='roc_auc')
-            
-            print(f"AUC Score: {auc:.4f}")
-            print(f"CV AUC Score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
-            print(f"Train Accuracy: {model.score(X_train, y_train):.4f}")
-            print(f"Test Accuracy: {model.score(X_test, y_test):.4f}")
-            print("\nClassification Report:")
-            print(classification_report(y_test, y_pred))
-            
-            model_results[name] = {
-                'model': model,
-                'auc': auc,
-                'cv_auc': cv_scores.mean(),
-                'cv_std': cv_scores.std(),
-                'y_pred': y_pred,
-                'y_pred_proba': y_pred_proba,
-                'train_acc': model.score(X_train, y_train),
-                'test_acc': model.score(X_test, y_test)
-            }
+            model_results[name] = self.evaluate_model(model, X_train, X_test, y_train, y_test)
+            if key is not None:
+                self.cache.put('models', key, model_results[name])
         
         # اختيار أفضل نموذج بناءً على AUC
         best_model_name = max(model_results.keys(), key=lambda x: model_results[x]['auc'])
@@ -302,6 +438,40 @@ class HeartDiseasePredictor:
         
         return model_results, best_model_name
 
+    def evaluate_model(self, model, X_train, X_test, y_train, y_test):
+        """تدريب وتقييم نموذج واحد"""
+        # التدريب
+        model.fit(X_train, y_train)
+        
+        # التنبؤ
+        y_pred = model.predict(X_test)
+        y_pred_proba = model.predict_proba(X_test)[:, 1]
+        
+        # التقييم
+        auc = roc_auc_score(y_test, y_pred_proba)
+        
+        # Cross-validation
+        cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='roc_auc')
+        
+        print(f"AUC Score: {auc:.4f}")
+        print(f"CV AUC Score: {cv_scores.mean():.4f} (+/- {cv_scores.std() * 2:.4f})")
+        print(f"Train Accuracy: {model.score(X_train, y_train):.4f}")
+        print(f"Test Accuracy: {model.score(X_test, y_test):.4f}")
+        print("\nClassification Report:")
+        print(classification_report(y_test, y_pred))
+        
+        return {
+            'model': model,
+            'auc': auc,
+            'cv_auc': cv_scores.mean(),
+            'cv_std': cv_scores.std(),
+            'cv_scores': cv_scores,
+            'y_pred': y_pred,
+            'y_pred_proba': y_pred_proba,
+            'train_acc': model.score(X_train, y_train),
+            'test_acc': model.score(X_test, y_test)
+        }
+
     def plot_model_comparison(self, model_results):
         """رسم مقارنة بين النماذج"""
         plt.style.use('seaborn-v0_8')
@@ -415,14 +585,46 @@ class HeartDiseasePredictor:
         plt.savefig('plots/roc_curves.png', dpi=300, bbox_inches='tight')
         plt.show()
 
+    def explainer_family(self):
+        """عائلة المفسر المناسبة لأفضل نموذج: tree أو linear أو kernel"""
+        if isinstance(self.best_model, (RandomForestClassifier, GradientBoostingClassifier, XGBClassifier)):
+            return 'tree'
+        if isinstance(self.best_model, (LogisticRegression, SGDClassifier)):
+            return 'linear'
+        return 'kernel'
+
+    def select_explainer(self, X_background, n_clusters=10):
+        """اختيار مفسر SHAP سريع حسب عائلة النموذج بدلاً من المفسر العام القائم على العينات"""
+        family = self.explainer_family()
+        if family == 'tree':
+            return shap.TreeExplainer(self.best_model)
+        if family == 'linear':
+            # تأثيرات دقيقة من المعاملات ومتوسط الخلفية
+            return shap.LinearExplainer(self.best_model, X_background)
+        
+        # KernelSHAP بخلفية ملخصة بـ k-means
+        model = self.best_model
+        background = shap.kmeans(X_background, min(n_clusters, len(X_background)))
+        return shap.KernelExplainer(lambda X: model.predict_proba(X)[:, 1], background)
+
     def create_shap_analysis(self, X_train, X_test):
         """إنشاء تحليل SHAP المتقدم"""
         try:
             print("\nإنشاء تحليل SHAP...")
             
-            # إنشاء SHAP explainer
-            explainer = shap.Explainer(self.best_model, X_train[:200])
-            shap_values = explainer(X_test[:100])
+            # إنشاء SHAP explainer مناسب لعائلة النموذج
+            explainer = self.select_explainer(X_train[:200])
+            if self.explainer_family() == 'kernel':
+                shap_values = explainer.shap_values(X_test[:100], nsamples=200, silent=True)
+            else:
+                shap_values = explainer.shap_values(X_test[:100])
+            
+            # توحيد المخرجات إلى تأثيرات الفئة الإيجابية
+            if isinstance(shap_values, list):
+                shap_values = shap_values[1]
+            shap_values = np.asarray(shap_values)
+            if shap_values.ndim == 3:
+                shap_values = shap_values[:, :, 1]
             
             # Summary plot
             plt.figure(figsize=(12, 8))
@@ -450,7 +652,418 @@ class HeartDiseasePredictor:
             print(f"خطأ في تحليل SHAP: {e}")
             return None
 
-    def save_model(self, model_results, best_model_name):
+    def distill_surrogate(self, X_train, X_test, boundaries=(0.3, 0.5, 0.7), n_domain_samples=20000):
+        """تقطير أفضل نموذج في نموذج خطي رخيص (في فضاء logit) لا يُحفظ إلا إذا طابقه تماماً"""
+        print("\nتقطير النموذج البديل السريع...")
+        
+        def logit(p):
+            p = np.clip(p, 1e-4, 1 - 1e-4)
+            return np.log(p / (1 - p))
+        
+        def sigmoid(z):
+            return 1 / (1 + np.exp(-z))
+        
+        def risk_bands(p):
+            # نفس حدود get_risk_level والتنبؤ في الخادم
+            return np.digitize(p, [0.3, 0.7]) * 2 + (p > 0.5)
+        
+        def domain(seed):
+            return self.scaler.transform(self.valid_domain_sample(n_domain_samples, seed=seed))
+        
+        teacher_train = self.best_model.predict_proba(X_train)[:, 1]
+        
+        student = Ridge(alpha=1.0)
+        student.fit(X_train, logit(teacher_train))
+        
+        # نصف الاختبار مع عينة من النطاق الصحيح للمعايرة، والنصف الآخر مع عينة مستقلة للقياس.
+        # هامش الثقة: أكبر خطأ (في فضاء logit) على مجموعة المعايرة؛ التنبؤ يُقص بنفس حدود logit
+        # لأن احتمالية النموذج الكامل مقصوصة، وكلاهما بعيد عن حدود الخطر عند القص
+        half = len(X_test) // 2
+        X_calibration = np.vstack([np.asarray(X_test)[:half], domain(seed=1)])
+        X_holdout = np.vstack([np.asarray(X_test)[half:], domain(seed=2)])
+        teacher_calibration = self.best_model.predict_proba(X_calibration)[:, 1]
+        margin = float(np.abs(logit(sigmoid(student.predict(X_calibration))) - logit(teacher_calibration)).max())
+        
+        # التطابق ونسبة التصعيد على بيانات لم تُستخدم في المعايرة
+        teacher_test = self.best_model.predict_proba(X_holdout)[:, 1]
+        center = student.predict(X_holdout)
+        low, high = sigmoid(center - margin), sigmoid(center + margin)
+        escalate = np.zeros(len(center), dtype=bool)
+        for boundary in boundaries:
+            escalate |= (low <= boundary) & (high >= boundary)
+        
+        cascade = np.where(escalate, teacher_test, sigmoid(center))
+        mismatches = int((risk_bands(cascade) != risk_bands(teacher_test)).sum())
+        agreement = 1 - mismatches / len(cascade)
+        escalation_rate = float(escalate.mean())
+        
+        # زمن صف واحد لكل مستوى (كما في طلب واحد في الخادم)
+        rows = np.asarray(X_test)[:200]
+        start = time.perf_counter()
+        for row in rows:
+            self.best_model.predict_proba(row.reshape(1, -1))
+        teacher_ms = (time.perf_counter() - start) / len(rows) * 1000
+        
+        start = time.perf_counter()
+        for row in rows:
+            float(np.dot(student.coef_, row)) + student.intercept_
+        surrogate_ms = (time.perf_counter() - start) / len(rows) * 1000
+        
+        cascade_ms = surrogate_ms + escalation_rate * teacher_ms
+        
+        print(f"التطابق مع النموذج الكامل: {agreement:.4f} ({mismatches} اختلاف من {len(X_holdout)} حالة خارج المعايرة)")
+        print(f"نسبة التصعيد للنموذج الكامل: {escalation_rate:.4f}")
+        print(f"متوسط الزمن: {teacher_ms:.3f} ms -> {cascade_ms:.3f} ms (توفير {teacher_ms - cascade_ms:.3f} ms)")
+        
+        if mismatches:
+            print("النموذج البديل يغير مستوى الخطر أو التنبؤ لبعض الحالات، لن يُحفظ")
+            self.surrogate = None
+            return None
+        
+        # دمج المعايرة في المعاملات حتى يعمل الخادم على القيم الخام مباشرة
+        coef = student.coef_ / self.scaler.scale_
+        intercept = float(student.intercept_ - np.dot(coef, self.scaler.mean_))
+        
+        self.surrogate = {
+            'model_type': str(type(self.best_model).__name__),
+            'feature_names': self.feature_names,
+            'coef': coef.tolist(),
+            'intercept': intercept,
+            'margin': margin,
+            'boundaries': list(boundaries),
+            'agreement': agreement,
+            'escalation_rate': escalation_rate,
+            'teacher_latency_ms': teacher_ms,
+            'cascade_latency_ms': cascade_ms
+        }
+        return self.surrogate
+
+    # valid_domain_sample و predict_compact نسختان من domain_sample و CompactTrees.predict_positive
+    # في backend/compact_trees.py: سكربت التدريب مستقل عن الخادم (صورة الخادم لا تحتوي ml/
+    # وهذا السكربت لا يستورد من backend/). أي اختلاف بينهما يكشفه الخادم عند التحميل، إذ يقارن
+    # النسخة المضغوطة بالنموذج الكامل على domain_sample ويرفضها إذا تجاوز الفرق 1e-6.
+    def valid_domain_sample(self, n_samples=20000, reference_data=None, seed=0):
+        """عينة من نطاق المدخلات الصحيحة (قيم خام) مع الحدود نفسها وصفوف مرجعية مقصوصة إليه"""
+        rng = np.random.default_rng(seed)
+        columns = []
+        for feature in self.feature_names:
+            low, high = self.feature_ranges[feature]
+            if feature in self.integer_features:
+                column = rng.integers(low, high + 1, n_samples).astype(float)
+            else:
+                column = np.round(rng.uniform(low, high, n_samples), 1)
+            column[:2] = (low, high)
+            columns.append(column)
+        X = np.column_stack(columns)
+        
+        if reference_data is not None:
+            reference = np.array(reference_data, dtype=float)
+            for j, feature in enumerate(self.feature_names):
+                reference[:, j] = np.clip(reference[:, j], *self.feature_ranges[feature])
+                if feature in self.integer_features:
+                    reference[:, j] = np.round(reference[:, j])
+            X = np.vstack([X, reference])
+        return X
+
+    @staticmethod
+    def float32_floor(values):
+        """أكبر float32 لا يتجاوز القيمة: float32(x) <= t تبقى مكافئة بعد التحويل"""
+        values = np.asarray(values, dtype=float)
+        rounded = values.astype(np.float32)
+        return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+    def tree_tables(self, model):
+        """جداول عقد موحدة لكل شجرة (يسار إذا float32(x) <= threshold) ونوع تجميع المجموعة
+
+        يعيد (kind, init, tables) أو None إذا لم يكن النموذج نموذج أشجار مدعوماً.
+        kind = 'mean' لمتوسط الاحتمالات، أو 'sum' لمجموع الهوامش ثم sigmoid.
+        """
+        def sklearn_table(tree, output, key):
+            return {
+                'left': tree.children_left, 'right': tree.children_right,
+                'feature': tree.feature, 'threshold': self.float32_floor(tree.threshold),
+                'output': output, 'key': key
+            }
+        
+        if isinstance(model, RandomForestClassifier):
+            tables = []
+            for estimator in model.estimators_:
+                values = estimator.tree_.value[:, 0, :]
+                proba = values / values.sum(axis=1, keepdims=True)
+                tables.append(sklearn_table(estimator.tree_, proba[:, 1], proba))
+            return 'mean', 0.0, tables
+        
+        if isinstance(model, GradientBoostingClassifier):
+            estimators = model.estimators_[:, 0]
+            tables = []
+            for estimator in estimators:
+                output = model.learning_rate * estimator.tree_.value[:, 0, 0]
+                tables.append(sklearn_table(estimator.tree_, output, estimator.tree_.value[:, 0, :]))
+            # الهامش الابتدائي (prior) = دالة القرار ناقص مساهمات كل الأشجار
+            row = np.zeros((1, len(self.feature_names)))
+            init = model.decision_function(row)[0] - sum(
+                model.learning_rate * estimator.predict(row)[0] for estimator in estimators
+            )
+            return 'sum', float(init), tables
+        
+        if isinstance(model, XGBClassifier):
+            learner = json.loads(model.get_booster().save_raw('json'))['learner']
+            base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+            tables = []
+            for tree in learner['gradient_booster']['model']['trees']:
+                left = np.array(tree['left_children'])
+                conditions = np.array(tree['split_conditions'], dtype=np.float32)
+                leaf = left == -1
+                # XGBoost يذهب يساراً إذا x < c، أي x <= أكبر float32 أصغر من c
+                threshold = np.where(leaf, conditions, np.nextafter(conditions, np.float32(-np.inf)))
+                output = np.where(leaf, conditions.astype(float), 0.0)
+                tables.append({
+                    'left': left, 'right': np.array(tree['right_children']),
+                    'feature': np.array(tree['split_indices']), 'threshold': threshold,
+                    'output': output, 'key': output[:, np.newaxis]
+                })
+            return 'sum', float(np.log(base_score / (1 - base_score))), tables
+        
+        return None
+
+    def prune_table(self, table, bounds):
+        """إزالة الفروع غير القابلة للوصول ضمن النطاقات الصحيحة ودمج الأوراق الشقيقة المتطابقة
+
+        bounds: (الأدنى، الأعلى) لكل ميزة بالقيم الخام. يعيد العقد المحتفظ بها بالترتيب الجديد
+        ومصدر قيمة كل عقدة وأبناءها بالترقيم الجديد (-1 للأوراق).
+        """
+        left, right = table['left'], table['right']
+        feature, threshold, key = table['feature'], table['threshold'], table['key']
+        mean, scale = self.scaler.mean_, self.scaler.scale_
+        integer_indices = {i for i, f in enumerate(self.feature_names) if f in self.integer_features}
+        kept, source, new_left, new_right = [], [], [], []
+        
+        def build(node, bounds):
+            index = len(kept)
+            kept.append(node)
+            source.append(node)
+            new_left.append(-1)
+            new_right.append(-1)
+            if left[node] == -1:
+                return index
+            
+            # عتبة الانقسام بالقيم الخام، مع هامش لأخطاء التقريب يُبقي الفرعين عند الشك
+            f = feature[node]
+            cut = float(threshold[node]) * scale[f] + mean[f]
+            eps = 1e-4 + 1e-6 * abs(cut)
+            low, high = bounds[f]
+            if f in integer_indices:
+                left_bounds = (low, min(high, int(np.floor(cut + eps))))
+                right_bounds = (max(low, int(np.floor(cut - eps)) + 1), high)
+            else:
+                left_bounds = (low, min(high, cut + eps))
+                right_bounds = (max(low, cut - eps), high)
+            
+            # فرع غير قابل للوصول: تُستبدل العقدة بالفرع الآخر
+            if left_bounds[0] > left_bounds[1] or right_bounds[0] > right_bounds[1]:
+                del kept[index:], source[index:], new_left[index:], new_right[index:]
+                child = right[node] if left_bounds[0] > left_bounds[1] else left[node]
+                return build(child, bounds)
+            
+            child_bounds = list(bounds)
+            child_bounds[f] = left_bounds
+            l = build(left[node], child_bounds)
+            child_bounds[f] = right_bounds
+            r = build(right[node], child_bounds)
+            
+            # ورقتان شقيقتان بنفس المخرجات تصبحان ورقة واحدة
+            if new_left[l] == -1 and new_left[r] == -1 and np.array_equal(key[source[l]], key[source[r]]):
+                source[index] = source[l]
+                del kept[l:], source[l:], new_left[l:], new_right[l:]
+            else:
+                new_left[index], new_right[index] = l, r
+            return index
+        
+        build(0, list(bounds))
+        return np.array(kept), np.array(source), np.array(new_left), np.array(new_right)
+
+    @staticmethod
+    def rebuild_sklearn_tree(tree, kept, source, new_left, new_right):
+        """بناء شجرة sklearn جديدة من العقد المحتفظ بها"""
+        state = tree.__getstate__()
+        nodes = state['nodes'][kept].copy()
+        nodes['left_child'] = new_left
+        nodes['right_child'] = new_right
+        leaf = new_left == -1
+        nodes['feature'][leaf] = -2
+        nodes['threshold'][leaf] = -2.0
+        
+        # العقد مرتبة بحيث يسبق الأب أبناءه
+        depth = np.zeros(len(kept), dtype=int)
+        internal = np.flatnonzero(~leaf)
+        for node in internal:
+            depth[new_left[node]] = depth[new_right[node]] = depth[node] + 1
+        
+        # إعادة حساب التغطية وقيم العقد الداخلية من الأوراق حتى يبقى TreeSHAP متسقاً
+        values = state['values'][source].copy()
+        for node in internal[::-1]:
+            l, r = new_left[node], new_right[node]
+            weights = nodes['weighted_n_node_samples'][[l, r]]
+            nodes['n_node_samples'][node] = nodes['n_node_samples'][l] + nodes['n_node_samples'][r]
+            nodes['weighted_n_node_samples'][node] = weights.sum()
+            values[node] = (weights[0] * values[l] + weights[1] * values[r]) / weights.sum()
+        
+        pruned = Tree(tree.n_features, np.asarray(tree.n_classes), tree.n_outputs)
+        pruned.__setstate__(dict(
+            state, nodes=nodes, values=values, node_count=len(kept), max_depth=int(depth.max())
+        ))
+        return pruned
+
+    @staticmethod
+    def compact_arrays(kind, init, tables):
+        """دمج كل الأشجار في مصفوفات متصلة بأنواع بيانات مضغوطة"""
+        sizes = [len(table['left']) for table in tables]
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        child_dtype = np.int16 if sum(sizes) < np.iinfo(np.int16).max else np.int32
+        
+        def children(key):
+            return np.concatenate([
+                np.where(table[key] >= 0, table[key] + root, -1) for table, root in zip(tables, roots)
+            ]).astype(child_dtype)
+        
+        return {
+            'kind': np.array(kind),
+            'init': np.array(init),
+            'roots': roots.astype(child_dtype),
+            'left': children('left'),
+            'right': children('right'),
+            'feature': np.concatenate([table['feature'] for table in tables]).astype(np.int8),
+            'threshold': np.concatenate([table['threshold'] for table in tables]).astype(np.float32),
+            'value': np.concatenate([table['output'] for table in tables]).astype(float)
+        }
+
+    @staticmethod
+    def predict_compact(compact, X):
+        """احتمالية الفئة الإيجابية من المصفوفات المضغوطة (كل الأشجار معاً، مستوى واحد في كل خطوة)"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, np.newaxis]
+        node = np.tile(compact['roots'], (len(X), 1))
+        while True:
+            left = compact['left'][node]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, compact['feature'][node]] <= compact['threshold'][node]
+            node = np.where(internal, np.where(go_left, left, compact['right'][node]), node)
+        
+        total = compact['value'][node].sum(axis=1)
+        if compact['kind'] == 'mean':
+            return total / len(compact['roots'])
+        return 1 / (1 + np.exp(-(compact['init'] + total)))
+
+    def optimize_tree_model(self, reference_data=None, n_parity_samples=20000):
+        """تمرير ما بعد التدريب: تقليم الأشجار ضمن نطاقات المدخلات الصحيحة ودمج الأوراق المتطابقة
+        وتصدير نسخة مضغوطة للخادم، مع اختبار تطابق المخرجات على النطاق الصحيح"""
+        print("\nتقليم وضغط نموذج الأشجار...")
+        self.compact_model = None
+        
+        # إعادة بناء أشجار sklearn تعتمد على تفاصيل داخلية في Tree قد تتغير بين الإصدارات:
+        # أي خطأ يعيد النموذج الأصلي دون نسخة مضغوطة بدلاً من إيقاف التدريب
+        original = copy.deepcopy(self.best_model)
+        try:
+            return self.prune_tree_model(original, reference_data, n_parity_samples)
+        except Exception as e:
+            print(f"تحذير: فشل تقليم النموذج ({type(e).__name__}: {e})، سيتم حفظ النموذج الأصلي")
+            self.best_model = original
+            self.compact_model = None
+            return None
+
+    def prune_tree_model(self, original, reference_data, n_parity_samples):
+        """تقليم self.best_model في مكانه وبناء النسخة المضغوطة (original نسخة لم تُعدّل للمقارنة)"""
+        model = self.best_model
+        extracted = self.tree_tables(model)
+        if extracted is None:
+            print(f"النموذج {type(model).__name__} ليس نموذج أشجار، تم تخطي التقليم")
+            return None
+        kind, init, tables = extracted
+        
+        size_before = len(pickle.dumps(model))
+        bounds = [self.feature_ranges[feature] for feature in self.feature_names]
+        
+        # أشجار sklearn تُقلّم في النموذج المحفوظ نفسه، و XGBoost في النسخة المضغوطة فقط
+        if isinstance(model, RandomForestClassifier):
+            estimators = list(model.estimators_)
+        elif isinstance(model, GradientBoostingClassifier):
+            estimators = list(model.estimators_[:, 0])
+        else:
+            estimators = None
+        
+        pruned_tables = []
+        for i, table in enumerate(tables):
+            kept, source, new_left, new_right = self.prune_table(table, bounds)
+            pruned_tables.append({
+                'left': new_left, 'right': new_right,
+                'feature': np.where(new_left == -1, -2, table['feature'][kept]),
+                'threshold': np.where(new_left == -1, -2, table['threshold'][kept]),
+                'output': table['output'][source]
+            })
+            if estimators is not None:
+                estimators[i].tree_ = self.rebuild_sklearn_tree(
+                    estimators[i].tree_, kept, source, new_left, new_right
+                )
+        compact = self.compact_arrays(kind, init, pruned_tables)
+        
+        # اختبار التطابق على النطاق الصحيح
+        X_domain = self.scaler.transform(self.valid_domain_sample(n_parity_samples, reference_data))
+        expected = original.predict_proba(X_domain)
+        if not np.array_equal(model.predict_proba(X_domain), expected):
+            print("تحذير: النموذج المقلّم لا يطابق الأصلي، سيتم حفظ النموذج الأصلي")
+            self.best_model = original
+            return None
+        
+        compact_error = float(np.abs(self.predict_compact(compact, X_domain) - expected[:, 1]).max())
+        if compact_error > 1e-6:
+            print(f"تحذير: النسخة المضغوطة لا تطابق النموذج (أكبر فرق {compact_error:.2e})، لن تُحفظ")
+            compact = None
+        
+        # زمن صف واحد (كما في طلب واحد في الخادم)
+        rows = X_domain[:200]
+        
+        def latency(predict):
+            predict(rows[:1])
+            start = time.perf_counter()
+            for row in rows:
+                predict(row.reshape(1, -1))
+            return (time.perf_counter() - start) / len(rows) * 1000
+        
+        nodes_before = sum(len(table['left']) for table in tables)
+        nodes_after = sum(len(table['left']) for table in pruned_tables)
+        size_after = len(pickle.dumps(model))
+        report = {
+            'nodes_before': nodes_before,
+            'nodes_after': nodes_after,
+            'pickle_bytes_before': size_before,
+            'pickle_bytes_after': size_after,
+            'parity_samples': len(X_domain),
+            'latency_ms_before': latency(original.predict_proba),
+            'latency_ms_after': latency(model.predict_proba)
+        }
+        print(f"عدد العقد: {nodes_before} -> {nodes_after} ({1 - nodes_after / nodes_before:.1%} أقل)")
+        if nodes_after > 0.99 * nodes_before:
+            # الأشجار المدربة على بيانات ضمن النطاقات الصحيحة لا تحتوي فروعاً خارجها تقريباً
+            print("التقليم لم يغير النموذج تقريباً: الفائدة من النسخة المضغوطة فقط")
+        print(f"حجم ملف النموذج: {size_before / 1024:.0f} KB -> {size_after / 1024:.0f} KB")
+        print(f"زمن التنبؤ لصف واحد: {report['latency_ms_before']:.3f} ms -> {report['latency_ms_after']:.3f} ms")
+        
+        if compact is not None:
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **compact)
+            report['compact_bytes'] = buffer.getbuffer().nbytes
+            report['compact_latency_ms'] = latency(lambda row: self.predict_compact(compact, row))
+            report['compact_max_error'] = compact_error
+            print(f"النسخة المضغوطة: {report['compact_bytes'] / 1024:.0f} KB، "
+                  f"زمن صف واحد {report['compact_latency_ms']:.3f} ms، أكبر فرق {compact_error:.2e}")
+        print(f"اختبار التطابق: {len(X_domain)} حالة ضمن النطاق الصحيح")
+        
+        self.compact_model = compact
+        return report
+
+    def save_model(self, model_results, best_model_name, reference_data=None):
         """حفظ أفضل نموذج ومعلوماته"""
         print("\nحفظ النموذج...")
         
@@ -462,34 +1075,346 @@ class HeartDiseasePredictor:
         joblib.dump(self.best_model, 'models/heart_disease_model.pkl')
         joblib.dump(self.scaler, 'models/scaler.pkl')
         
-        # حفظ معلومات النموذج
+        # حفظ معلومات النموذج (المقاييس الرقمية فقط، النموذج والتنبؤات غير قابلة للتحويل إلى JSON)
+        performance = {}
+        for key in ('auc', 'cv_auc', 'cv_std', 'train_acc', 'test_acc'):
+            value = float(model_results[best_model_name][key])
+            performance[key] = value if np.isfinite(value) else None
+        
         model_info = {
             'best_model': best_model_name,
-            'performance': model_results[best_model_name],
+            'performance': performance,
             'feature_names': self.feature_names,
             'feature_names_ar': self.feature_names_ar,
             'training_date': datetime.now().isoformat(),
-            'model_type': str(type(self.best_model).__name__)
+            'model_type': str(type(self.best_model).__name__),
+            'explainer': self.explainer_family()
         }
         
         # حفظ المعلومات
-        import json
         with open('models/model_info.json', 'w', encoding='utf-8') as f:
             json.dump(model_info, f, ensure_ascii=False, indent=2)
         
+        # عينة مرجعية بالقيم الخام يحسب منها الخادم تحليلات المجتمع مرة واحدة عند التحميل
+        if reference_data is not None:
+            np.save('models/reference_sample.npy', np.asarray(reference_data, dtype=float)[:1000])
+        
+        # حفظ النموذج البديل للمسار المتدرج (إن وُجد)
+        surrogate_path = 'models/surrogate.json'
+        if self.surrogate is not None:
+            with open(surrogate_path, 'w', encoding='utf-8') as f:
+                json.dump(self.surrogate, f, ensure_ascii=False, indent=2)
+        elif os.path.exists(surrogate_path):
+            os.remove(surrogate_path)
+        
+        # النسخة المضغوطة للخادم مع بصمة ملف النموذج الذي تطابقه
+        compact_path = 'models/compact_model.npz'
+        if self.compact_model is not None:
+            with open('models/heart_disease_model.pkl', 'rb') as f:
+                model_version = hashlib.sha256(f.read()).hexdigest()[:16]
+            np.savez_compressed(compact_path, model_version=np.array(model_version), **self.compact_model)
+        elif os.path.exists(compact_path):
+            os.remove(compact_path)
+        
         print(f"تم حفظ النموذج: {best_model_name}")
         print(f"AUC Score: {model_results[best_model_name]['auc']:.4f}")
         print(f"مكان النموذج: models/heart_disease_model.pkl")
         print(f"مكان المعايرة: models/scaler.pkl")
 
-def main():
+    def iter_data_chunks(self, csv_path, chunksize=100000, split='train', test_fraction=0.2):
+        """قراءة البيانات من القرص على دفعات مع تقسيم train/test بالـ hash دون تحميلها كاملة"""
+        reader = pd.read_csv(csv_path, usecols=self.feature_names + ['target'], chunksize=chunksize)
+        for chunk in reader:
+            chunk = chunk.dropna(subset=['target'])
+            
+            # نفس الصف يقع دائماً في نفس الجهة مهما كان ترتيب الدفعات
+            buckets = pd.util.hash_pandas_object(chunk[self.feature_names], index=False).to_numpy() % 100
+            in_test = buckets < test_fraction * 100
+            mask = in_test if split == 'test' else ~in_test
+            if not mask.any():
+                continue
+            
+            part = chunk[mask]
+            yield part[self.feature_names].to_numpy(dtype=np.float64), part['target'].to_numpy(dtype=np.int64)
+
+    def iter_scaled_chunks(self, csv_path, chunksize=100000, split='train', test_fraction=0.2):
+        """دفعات مطبّعة جاهزة للتدريب (القيم المفقودة تُملأ بالمتوسط المحسوب تدريجياً)"""
+        for X, y in self.iter_data_chunks(csv_path, chunksize, split, test_fraction):
+            X = np.where(np.isnan(X), self.scaler.mean_, X)
+            yield self.scaler.transform(X).astype(np.float32), y
+
+    def predict_out_of_core(self, model, csv_path, chunksize=100000, test_fraction=0.2):
+        """التنبؤ على بيانات الاختبار دفعة بدفعة"""
+        y_parts, proba_parts = [], []
+        for X, y in self.iter_scaled_chunks(csv_path, chunksize, 'test', test_fraction):
+            y_parts.append(y)
+            proba_parts.append(model.predict_proba(X)[:, 1])
+        return np.concatenate(y_parts), np.concatenate(proba_parts)
+
+    @staticmethod
+    def reservoir_sample(chunks, size, seed=42):
+        """عينة عشوائية منتظمة بحجم ثابت من تدفق دفعات (الذاكرة بحجم العينة + دفعة واحدة)"""
+        rng = np.random.default_rng(seed)
+        X_sample, y_sample, keys = None, None, np.empty(0)
+        for X, y in chunks:
+            # الإبقاء على الصفوف ذات أصغر مفاتيح عشوائية = عينة منتظمة دون إرجاع
+            keys = np.concatenate([keys, rng.random(len(X))])
+            X_sample = X if X_sample is None else np.concatenate([X_sample, X])
+            y_sample = y if y_sample is None else np.concatenate([y_sample, y])
+            if len(keys) > size:
+                keep = np.argpartition(keys, size)[:size]
+                X_sample, y_sample, keys = X_sample[keep], y_sample[keep], keys[keep]
+        return X_sample, y_sample
+
+    def train_out_of_core(self, csv_path, chunksize=100000, test_fraction=0.2, n_epochs=5,
+                          cache_dir='data/xgb_cache', forest_sample_size=200000):
+        """تدريب النماذج من ملف CSV على القرص بذاكرة محدودة بحجم الدفعة"""
+        print("\n" + "="*70)
+        print("بدء التدريب خارج الذاكرة (out-of-core)")
+        print("="*70)
+        
+        def chunks(split):
+            return self.iter_scaled_chunks(csv_path, chunksize, split, test_fraction)
+        
+        # المرور الأول: حساب معاملات التطبيع تدريجياً
+        self.scaler = StandardScaler()
+        n_train, n_chunks = 0, 0
+        for X, _ in self.iter_data_chunks(csv_path, chunksize, 'train', test_fraction):
+            self.scaler.partial_fit(X)
+            n_train += len(X)
+            n_chunks += 1
+        
+        if n_chunks == 0:
+            raise ValueError(f"لا توجد بيانات تدريب في {csv_path}")
+        print(f"حجم بيانات التدريب: {n_train} ({n_chunks} دفعة)")
+        
+        self.define_models()
+        
+        # RandomForest: عدد الأشجار ثابت ومدرب على عينة عشوائية محدودة الحجم من كل الدفعات
+        # (شجرة لكل دفعة تجعل حجم الغابة ينمو مع البيانات وكل شجرة ترى دفعة واحدة فقط)
+        forest = self.models['RandomForest']
+        X_sample, y_sample = self.reservoir_sample(chunks('train'), forest_sample_size)
+        print(f"عينة تدريب RandomForest: {len(X_sample)} من {n_train}")
+        if len(np.unique(y_sample)) == 2:
+            forest.fit(X_sample, y_sample)
+        
+        # XGBoost: DMatrix بذاكرة خارجية وخوارزمية hist
+        template = self.models['XGBoost']
+        params = template.get_xgb_params()
+        params['tree_method'] = 'hist'
+        os.makedirs(cache_dir, exist_ok=True)
+        dtrain = xgb.DMatrix(ChunkDataIterator(lambda: chunks('train'), os.path.join(cache_dir, 'train')))
+        booster = xgb.train(params, dtrain, num_boost_round=template.n_estimators)
+        boosted = XGBClassifier(**template.get_params())
+        boosted.load_model(booster.save_raw('ubj'))
+        
+        # نموذج خطي لوجستي بـ partial_fit على عدة مرور
+        linear = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+        for _ in range(n_epochs):
+            for X, y in chunks('train'):
+                linear.partial_fit(X, y, classes=np.array([0, 1]))
+        
+        self.models = {'RandomForest': forest, 'XGBoost': boosted, 'SGDLogistic': linear}
+        
+        model_results = {}
+        y_test = None
+        for name, model in self.models.items():
+            if name == 'RandomForest' and not hasattr(model, 'estimators_'):
+                print("لم يتم تدريب RandomForest (لا توجد دفعة تحتوي على الفئتين)")
+                continue
+            
+            y_test, y_pred_proba = self.predict_out_of_core(model, csv_path, chunksize, test_fraction)
+            y_pred = (y_pred_proba > 0.5).astype(int)
+            auc = roc_auc_score(y_test, y_pred_proba)
+            test_acc = float((y_pred == y_test).mean())
+            
+            print(f"\n{name}: AUC Score: {auc:.4f}, Test Accuracy: {test_acc:.4f}")
+            
+            model_results[name] = {
+                'model': model,
+                'auc': auc,
+                'cv_auc': np.nan,
+                'cv_std': np.nan,
+                'y_pred': y_pred,
+                'y_pred_proba': y_pred_proba,
+                'train_acc': np.nan,
+                'test_acc': test_acc
+            }
+        
+        best_model_name = max(model_results.keys(), key=lambda x: model_results[x]['auc'])
+        self.best_model = model_results[best_model_name]['model']
+        
+        print(f"\n{'='*70}")
+        print(f"أفضل نموذج: {best_model_name}")
+        print(f"AUC Score: {model_results[best_model_name]['auc']:.4f}")
+        print('='*70)
+        
+        return model_results, best_model_name, y_test
+
+    def load_production_model(self, models_dir='models'):
+        """تحميل النموذج والمعايرة المنشورين حالياً"""
+        self.best_model = joblib.load(os.path.join(models_dir, 'heart_disease_model.pkl'))
+        self.scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
+        return self.best_model
+
+    def load_model_info(self, models_dir='models'):
+        """قراءة معلومات النموذج المنشور (أو قاموس فارغ إن لم تتوفر)"""
+        try:
+            with open(os.path.join(models_dir, 'model_info.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def read_feedback_log(self, feedback_path, offset=0):
+        """قراءة السجلات الجديدة فقط من سجل النتائج المؤكدة ابتداءً من موضع محدد"""
+        columns = self.feature_names + ['target']
+        if not os.path.exists(feedback_path):
+            return pd.DataFrame(columns=columns), offset
+        
+        # إذا تم تدوير السجل أو اقتطاعه نبدأ من البداية
+        if os.path.getsize(feedback_path) < offset:
+            offset = 0
+        
+        records = []
+        with open(feedback_path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break  # سطر غير مكتمل ما زال قيد الكتابة
+                offset += len(raw)
+                try:
+                    records.append(json.loads(raw))
+                except ValueError:
+                    continue
+        
+        df = pd.DataFrame(records, columns=columns).dropna()
+        df['target'] = df['target'].astype(int)
+        return df, offset
+
+    def continue_training(self, model, X_new, y_new, n_new_estimators=20, linear_eta=0.01):
+        """متابعة تدريب نموذج موجود على البيانات الجديدة فقط حسب عائلة النموذج"""
+        if isinstance(model, XGBClassifier):
+            # متابعة التعزيز من الـ booster الحالي، ثم n_estimators = العدد الكلي للجولات
+            model.set_params(n_estimators=n_new_estimators)
+            model.fit(X_new, y_new, xgb_model=model.get_booster())
+            model.set_params(n_estimators=model.get_booster().num_boosted_rounds())
+        elif isinstance(model, (RandomForestClassifier, GradientBoostingClassifier)):
+            # warm start: إضافة أشجار جديدة مع الإبقاء على الأشجار السابقة
+            model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new_estimators)
+            model.fit(X_new, y_new)
+        elif hasattr(model, 'partial_fit'):
+            model.partial_fit(X_new, y_new, classes=np.array([0, 1]))
+        elif isinstance(model, LogisticRegression):
+            # لا يدعم partial_fit (وإعادة fit على الدفعة الجديدة وحدها تنسى بيانات التدريب):
+            # نموذج SGD لوجستي يبدأ من معاملاته ويمر على الدفعة الجديدة مرة واحدة فقط،
+            # والتحديثات التالية عبر partial_fit
+            linear = SGDClassifier(loss='log_loss', alpha=1e-4, learning_rate='constant', eta0=linear_eta,
+                                   max_iter=1, tol=None, random_state=42)
+            linear.fit(X_new, y_new, coef_init=model.coef_.copy(), intercept_init=model.intercept_.copy())
+            return linear
+        else:
+            # SVM لا يدعم partial_fit ولا بداية من معاملات سابقة
+            return None
+        return model
+
+    def incremental_update(self, feedback_path, models_dir='models', min_new_samples=50,
+                           holdout_fraction=0.2, tolerance=0.01, n_new_estimators=20):
+        """تحديث النموذج المنشور تدريجياً من النتائج المؤكدة الجديدة فقط"""
+        print("بدء التحديث التدريجي للنموذج...")
+        
+        self.load_production_model(models_dir)
+        model_info = self.load_model_info(models_dir)
+        offset = model_info.get('feedback_offset', 0)
+        
+        df, new_offset = self.read_feedback_log(feedback_path, offset)
+        print(f"عدد السجلات الجديدة: {len(df)}")
+        
+        if len(df) < min_new_samples:
+            print(f"عدد السجلات أقل من الحد الأدنى ({min_new_samples})، لن يتم التحديث")
+            return False
+        
+        # تقسيم ثابت بالـ hash بحيث يبقى كل سجل في نفس الجهة دائماً
+        buckets = df[self.feature_names].astype(str).agg('|'.join, axis=1).map(
+            lambda key: zlib.crc32(key.encode('utf-8')) % 100
+        )
+        holdout_mask = (buckets < holdout_fraction * 100).to_numpy()
+        update_df = df[~holdout_mask]
+        holdout_df = df[holdout_mask]
+        
+        if update_df['target'].nunique() < 2 or len(holdout_df) == 0:
+            print("البيانات الجديدة لا تحتوي على الفئتين أو لا توجد بيانات تحقق، لن يتم التحديث")
+            return False
+        
+        # المعايرة ثابتة حتى يبقى فضاء المدخلات متوافقاً مع النموذج المنشور
+        X_update = self.scaler.transform(update_df[self.feature_names])
+        X_holdout = self.scaler.transform(holdout_df[self.feature_names])
+        y_update = update_df['target'].to_numpy()
+        y_holdout = holdout_df['target'].to_numpy()
+        
+        baseline = self.best_model
+        candidate = self.continue_training(
+            copy.deepcopy(baseline), X_update, y_update, n_new_estimators=n_new_estimators
+        )
+        if candidate is None:
+            print(f"النموذج {type(baseline).__name__} لا يدعم التدريب التدريجي، يلزم تدريب كامل")
+            return False
+        
+        baseline_loss = log_loss(y_holdout, baseline.predict_proba(X_holdout)[:, 1], labels=[0, 1])
+        candidate_loss = log_loss(y_holdout, candidate.predict_proba(X_holdout)[:, 1], labels=[0, 1])
+        print(f"Holdout log loss (الحالي): {baseline_loss:.4f}")
+        print(f"Holdout log loss (المحدث): {candidate_loss:.4f}")
+        
+        if candidate_loss > baseline_loss * (1 + tolerance):
+            print("النموذج المحدث أسوأ على بيانات التحقق، لن يتم النشر")
+            return False
+        
+        self.best_model = candidate
+        model_info.setdefault('incremental_updates', []).append({
+            'date': datetime.now().isoformat(),
+            'n_update': int(len(update_df)),
+            'n_holdout': int(len(holdout_df)),
+            'baseline_log_loss': float(baseline_loss),
+            'log_loss': float(candidate_loss)
+        })
+        model_info['feedback_offset'] = new_offset
+        model_info['model_type'] = str(type(candidate).__name__)
+        self.publish_model(model_info, models_dir)
+        return True
+
+    def publish_model(self, model_info, models_dir='models'):
+        """نشر النموذج ومعلوماته بكتابة ذرية حتى لا يقرأ الخادم ملفاً ناقصاً"""
+        os.makedirs(models_dir, exist_ok=True)
+        model_path = os.path.join(models_dir, 'heart_disease_model.pkl')
+        info_path = os.path.join(models_dir, 'model_info.json')
+        
+        joblib.dump(self.best_model, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        
+        with open(info_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(model_info, f, ensure_ascii=False, indent=2)
+        os.replace(info_path + '.tmp', info_path)
+        
+        # النموذج البديل مُقطّر من النموذج السابق ولم يعد مطابقاً له
+        surrogate_path = os.path.join(models_dir, 'surrogate.json')
+        if os.path.exists(surrogate_path):
+            os.remove(surrogate_path)
+            print("تم حذف النموذج البديل القديم، يلزم تدريب كامل لإعادة تقطيره")
+        
+        # النسخة المضغوطة تطابق النموذج السابق فقط
+        compact_path = os.path.join(models_dir, 'compact_model.npz')
+        if os.path.exists(compact_path):
+            os.remove(compact_path)
+        
+        print(f"تم نشر النموذج المحدث: {model_path}")
+
+def main(cache=None):
     """الدالة الرئيسية للتدريب المتقدم"""
     print("="*80)
     print("نظام التدريب المتقدم لنموذج التنبؤ بأمراض القلب")
     print("="*80)
     
     # إنشاء كائن المتنبئ
-    predictor = HeartDiseasePredictor()
+    predictor = HeartDiseasePredictor(cache=cache)
     
     # إنشاء مجلدات الحفظ
     os.makedirs('models', exist_ok=True)
@@ -497,10 +1422,10 @@ def main():
     os.makedirs('data', exist_ok=True)
     
     # إنشاء البيانات
-    df = predictor.create_enhanced_synthetic_data(n_samples=2000)
+    df = predictor.load_or_create_data(n_samples=2000)
     
     # تحضير البيانات
-    X_train_scaled, X_test_scaled, y_train, y_test, X_train, X_test = predictor.prepare_data(df)
+    X_train_scaled, X_test_scaled, y_train, y_test, X_train, X_test = predictor.prepare_data_cached(df)
     
     # تعريف النماذج
     predictor.define_models()
@@ -518,12 +1443,90 @@ def main():
     # تحليل SHAP
     predictor.create_shap_analysis(X_train_scaled, X_test_scaled)
     
+    # تقطير النموذج البديل السريع
+    predictor.distill_surrogate(X_train_scaled, X_test_scaled)
+    
+    # تقليم الأشجار وضغطها ضمن نطاقات المدخلات الصحيحة
+    predictor.optimize_tree_model(reference_data=X_test)
+    
     # حفظ النموذج
-    predictor.save_model(model_results, best_model_name)
+    predictor.save_model(model_results, best_model_name, reference_data=X_test)
+    
+    print("\n" + "="*80)
+    print("اكتمل التدريب بنجاح!")
+    print("="*80)
+
+def out_of_core_main(csv_path, chunksize):
+    """التدريب من ملف بيانات كبير على القرص بذاكرة محدودة"""
+    print("="*80)
+    print("التدريب خارج الذاكرة لنموذج التنبؤ بأمراض القلب")
+    print("="*80)
+    
+    predictor = HeartDiseasePredictor()
+    
+    os.makedirs('models', exist_ok=True)
+    os.makedirs('plots', exist_ok=True)
+    os.makedirs('data', exist_ok=True)
+    
+    model_results, best_model_name, y_test = predictor.train_out_of_core(csv_path, chunksize=chunksize)
+    
+    predictor.plot_confusion_matrix(y_test, model_results[best_model_name]['y_pred'], best_model_name)
+    predictor.plot_roc_curve(y_test, model_results)
+    
+    # تقطير النموذج البديل على الدفعة الأولى فقط لإبقاء الذاكرة محدودة
+    predictor.distill_surrogate(
+        next(predictor.iter_scaled_chunks(csv_path, chunksize, 'train'))[0],
+        next(predictor.iter_scaled_chunks(csv_path, chunksize, 'test'))[0]
+    )
+    
+    predictor.optimize_tree_model(
+        reference_data=next(predictor.iter_data_chunks(csv_path, chunksize, 'test'))[0]
+    )
+    
+    predictor.save_model(
+        model_results, best_model_name,
+        reference_data=next(predictor.iter_data_chunks(csv_path, chunksize, 'test'))[0]
+    )
     
     print("\n" + "="*80)
     print("اكتمل التدريب بنجاح!")
     print("="*80)
 
+def incremental_main(feedback_path):
+    """التحديث التدريجي للنموذج المنشور من سجل النتائج المؤكدة"""
+    print("="*80)
+    print("التحديث التدريجي لنموذج التنبؤ بأمراض القلب")
+    print("="*80)
+    
+    predictor = HeartDiseasePredictor()
+    updated = predictor.incremental_update(feedback_path)
+    
+    print("\n" + "="*80)
+    print("تم نشر النموذج المحدث!" if updated else "لم يتم تغيير النموذج المنشور")
+    print("="*80)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='تدريب نموذج التنبؤ بأمراض القلب')
+    parser.add_argument('--incremental', action='store_true',
+                        help='تحديث النموذج المنشور من سجل النتائج المؤكدة بدلاً من التدريب الكامل')
+    parser.add_argument('--feedback-log', default='../backend/logs/feedback_outcomes.jsonl',
+                        help='مسار سجل النتائج المؤكدة')
+    parser.add_argument('--data', help='ملف CSV للتدريب خارج الذاكرة (يحتوي على الميزات و target)')
+    parser.add_argument('--chunksize', type=int, default=100000,
+                        help='عدد الصفوف في كل دفعة عند التدريب خارج الذاكرة')
+    parser.add_argument('--cache-dir', default='cache', help='مجلد الذاكرة المؤقتة للتدريب')
+    parser.add_argument('--cache-max-mb', type=int, default=1024, help='الحد الأقصى لحجم الذاكرة المؤقتة')
+    parser.add_argument('--no-cache', action='store_true', help='تدريب كامل دون استخدام الذاكرة المؤقتة')
+    parser.add_argument('--clear-cache', action='store_true', help='مسح الذاكرة المؤقتة ثم الخروج')
+    args = parser.parse_args()
+    
+    cache = TrainingCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+    
+    if args.clear_cache:
+        cache.clear()
+    elif args.incremental:
+        incremental_main(args.feedback_log)
+    elif args.data:
+        out_of_core_main(args.data, args.chunksize)
+    else:
+        main(cache=None if args.no_cache else cache)
\ No newline at end of file